@@ -4,28 +4,155 @@ from discord.ext import commands, tasks
 from discord import Interaction, app_commands
 import yaml
 import os
+import sys
+import copy
+import json
+import atexit
+import base64
+import sqlite3
+import tempfile
+import shutil
 import asyncio
+import bisect
+import heapq
+import threading
+import time
 import random
+import re
+import hashlib
+import uuid
 import dotenv
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from typing import Optional
+from bump_queue import AD_ALLOWED_MENTIONS, BUMP_SEND_ATTEMPTS, BumpQueue, DELIVERED, DONE, FAILED, FORBIDDEN
+import metrics
 
 
+class XtremeBumpBot(commands.AutoShardedBot):
+    """ The bot, plus one aiohttp session that stays open for our own requests to the Discord API. """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.web_session = None
+        self.metrics_server = None
+
+    async def setup_hook(self):
+        # Keep connections to discord.com open and cache DNS, so /get-id doesn't set up TCP + TLS every time
+        connector = aiohttp.TCPConnector(limit=20, ttl_dns_cache=300, keepalive_timeout=60)
+        self.web_session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10))
+        if METRICS_PORT:
+            self.metrics_server = await metrics.start_metrics_server(METRICS_HOST, METRICS_PORT)
+            log.info("📈 Metrics on http://%s:%s/metrics", METRICS_HOST, METRICS_PORT)
+
+    async def close(self):
+        await bump_cooldowns.flush()  # Keep the cooldowns after a restart
+        await recent_deliveries.flush()
+        if self.web_session:
+            await self.web_session.close()
+        if self.metrics_server:
+            await self.metrics_server.cleanup()
+        await super().close()
+
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+log = metrics.setup_logging("bumpbot", LOG_LEVEL)
+
+# Metrics page (/metrics) for Prometheus, off when METRICS_PORT is empty. Give every process its own port.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT")) if os.getenv("METRICS_PORT") else None
+
+# Low memory mode: only the gateway events and cache the bot really needs (guilds, channels, roles and DMs)
+LOW_MEMORY = os.getenv("LOW_MEMORY", "0").lower() in ("1", "true", "yes")
+
+# Sharding: leave both empty to let Discord decide. To split the bot over more processes give every
+# process the same SHARD_COUNT and its own SHARD_IDS (like "0,1" and "2,3").
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv("SHARD_IDS", "").split(",") if shard_id.strip()] or None
+
+def shard_file(file_name):
+    """ Own file for every process with its own shards: auto-bump.yml -> auto-bump-0-1.yml for SHARD_IDS=0,1. """
+    if not SHARD_IDS:
+        return file_name
+    name, extension = os.path.splitext(file_name)
+    return f"{name}-{'-'.join(map(str, SHARD_IDS))}{extension}"
+
+def is_local_guild(guild_id):
+    """ True when the server belongs to one of the shards this process runs. """
+    if not bot.shard_count or bot.shard_ids is None:
+        return True  # We run all shards
+    return (int(guild_id) >> 22) % bot.shard_count in bot.shard_ids
+
+def build_bot_options():
+    options = {"intents": discord.Intents.default()}
+    if SHARD_COUNT:
+        options["shard_count"] = SHARD_COUNT
+    if SHARD_IDS:
+        options["shard_ids"] = SHARD_IDS
+
+    if LOW_MEMORY:
+        intents = discord.Intents.none()
+        intents.guilds = True  # Servers, channels, roles and our own permissions
+        intents.dm_messages = True  # DM commands (!help, !suggest, ...)
+        options.update({
+            "intents": intents,
+            "max_messages": None,  # No message cache
+            "member_cache_flags": discord.MemberCacheFlags.none(),  # Only the bot itself is cached (guild.me)
+            "chunk_guilds_at_startup": False,
+        })
+    return options
+
 # Bot settings
-intents = discord.Intents.default()
-bot = commands.Bot(command_prefix="/", intents=intents)
-OWNER_IDS = {1198268147027955763, 9876543210}  Bot owner ID/IDs here
+BUMP_MAX_RATELIMIT_WAIT = 30.0  # Longer rate limits than this (seconds) are given back to us instead of waiting in discord.py
+bot = XtremeBumpBot(command_prefix="/", max_ratelimit_timeout=BUMP_MAX_RATELIMIT_WAIT, **build_bot_options())
+
+OWNER_IDS = {1198268147027955763, 9876543210}  # Bot owner ID/IDs here
 BUMP_LIMIT = 100  # Max servers where the bot will bump to
+BUMP_CONCURRENCY = 10  # Max bump messages that are being sent at the same time (for the whole bot)
+BUMP_QUEUE_LIMIT = 500  # Max bump messages waiting in the queue, bumps wait for room when it is full
+BUMP_WORKERS = os.getenv("BUMP_WORKERS", "0").lower() in ("1", "true", "yes")  # Let bump_worker.py processes send the bumps
+BUMP_WORKER_TIMEOUT = 300  # Max seconds a bump waits for the workers
+
+# Cooldown (minutes) and queue weight (messages per turn in the bump queue) for every tier
+BUMP_TIERS = {
+    "free": {"cooldown": 60, "weight": 1},
+    "premium": {"cooldown": 45, "weight": 2},
+}
 
 DATA_FOLDER = "servers"
 BLOCKLIST_FILE = "blocked-servers.yml"
 PREMIUM_FILE = "premium-servers.yml"
 PREMIUM_DATA = "premium-servers.yml"
-
-load_dotenv()
+AD_MIN_LENGTH = 10  # Shorter ads are rejected in /setup
+AD_MAX_LENGTH = 1500  # Same as the max length of the /setup form
+# Every process with its own shards only auto-bumps its own servers, so it keeps its own log
+AUTO_BUMP_FILE = shard_file("auto-bump.yml")
+SHARED_AUTO_BUMP_FILE = "auto-bump.yml"  # Used by the processes before they had their own file
+TARGET_HEALTH_FILE = shard_file("target-health.yml")  # Every process only sends to the servers of its own shards
+COMPACT_INTERVAL = timedelta(hours=6)  # How often expired premium entries and data of left servers are removed
+LEFT_SERVER_GRACE = timedelta(days=7)  # Data of a server is kept this long after the bot left it (it may come back)
+BULK_ID_LIMIT = 1000  # Max server IDs in one bulk command
+BULK_FILE_LIMIT = 256 * 1024  # Max size of an uploaded ID list
+RECENT_DELIVERIES_FILE = shard_file("recent-deliveries.yml")  # Every process only bumps from its own servers
+RECENT_DELIVERY_WINDOW = timedelta(hours=2)  # A server gets the same ad again only when there are no other targets left
+RECENT_DELIVERY_BUCKETS = 6  # The window is split in this many filters, the oldest is cleared when a new one starts
+RECENT_DELIVERY_BITS = 2 ** 17  # Bits per filter (16 KB), ~1% false positives at 13k deliveries per bucket
+TARGET_QUARANTINE = timedelta(minutes=15)  # First quarantine of a failing bump channel, doubles every time it fails again
+TARGET_MAX_QUARANTINE = timedelta(days=2)
+TARGET_NOTIFY_AFTER = 3  # Failures in a row before the server owner gets a DM to run /setup again
+# Every process with its own shards keeps its own cooldowns (the servers of other shards never bump here)
+COOLDOWN_FILE = shard_file("bump-cooldowns.yml")
+AUTO_BUMP_INTERVAL = timedelta(minutes=90)  # Every premium server is auto-bumped once per interval
+AUTO_BUMP_PARALLEL = 3  # Max premium servers that are auto-bumped at the same time
 
 TOKEN = os.getenv("DISCORD_TOKEN")
+DISCORD_API = os.getenv("DISCORD_API", "https://discord.com/api/v10")  # Only for our own requests (/get-id)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "yaml")  # "yaml" (a yml file for everything) or "sqlite"
+STORAGE_DB = os.getenv("STORAGE_DB", "bumpbot.db")  # Database file for the sqlite backend
 
 for folder in [DATA_FOLDER]:
     os.makedirs(folder, exist_ok=True)
@@ -34,11 +161,31 @@ for file in [BLOCKLIST_FILE, PREMIUM_FILE]:
         with open(file, "w") as f:
             yaml.dump({}, f)
 
-# load yaml
+# Use the fast libyaml loader/dumper when PyYAML was built with it
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+YamlDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# All file and database access runs in these threads, never on the event loop itself
+io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bumpbot-io")
+
+async def run_io(func, *args):
+    """ Runs a blocking (file) function in the I/O threads and waits for the result. """
+    return await asyncio.get_running_loop().run_in_executor(io_executor, func, *args)
+
+# load yaml (from the storage backend)
 def load_yaml(filepath):
+    with metrics.storage_duration.time("load"):
+        return storage.load(filepath)
+
+# Other calls to the storage backend, timed like load_yaml/save_yaml
+def timed_storage(operation, func, *args):
+    with metrics.storage_duration.time(operation):
+        return func(*args)
+
+def read_yaml_file(filepath):
     if os.path.exists(filepath):
         with open(filepath, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f) or {}
+            return yaml.load(f, Loader=YamlLoader) or {}
     return {}
         
 def get_bump_channel(guild_id):
@@ -48,38 +195,1265 @@ def get_bump_channel(guild_id):
 
 # check if the server is blocked
 def is_blacklisted(server_id):
-    blocked_servers = load_yaml(BLOCKLIST_FILE)
-    return str(server_id) in blocked_servers
+    return blocklist.is_blocked(server_id)
 
-# function to save .yml
+# function to save .yml (in the storage backend)
 def save_yaml(file_path, data):
+    with metrics.storage_duration.time("save"):
+        storage.save(file_path, data)
+
+def write_yaml_file(file_path, data):
     directory = os.path.dirname(file_path)
 
     # map make system
     if directory and not os.path.exists(directory):
         os.makedirs(directory, exist_ok=True)
 
-    with open(file_path, "w", encoding="utf-8") as f:
-        yaml.safe_dump(data, f, default_flow_style=False)
+    # Write to a temp file first and swap it in, so a crash never leaves a half written (or empty) file
+    fd, temp_path = tempfile.mkstemp(dir=directory or ".", prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            yaml.dump(data, f, Dumper=YamlDumper, default_flow_style=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    fsync_directory(directory or ".")
+
+def fsync_directory(directory):
+    """ Makes sure the rename itself is on disk too. """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # Not possible on every OS (Windows)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class FileWriter:
+    """ Does the writes of the bot one file at a time (asyncio lock per file). When more saves for a
+    file come in while it is being written, only the newest data is written after that. """
+
+    def __init__(self):
+        self._locks = {}  # {file path: asyncio.Lock}
+        self._pending = {}  # {file path: newest data that still has to be written}
+        self._writes = {}  # {file path: task that writes the pending data}
+        self._tasks = set()
+
+    def _lock(self, key):
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    def _start(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def save(self, file_path, data):
+        """ Saves in the background. Without an event loop (yet) it is written right away. """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return save_yaml(file_path, data)
+        first = file_path not in self._pending
+        self._pending[file_path] = data
+        if first:
+            self._writes[file_path] = self._start(self._write(file_path))
+
+    async def save_and_wait(self, file_path, data):
+        """ Saves and waits until it is written, returns False when the write failed. """
+        self.save(file_path, data)
+        write = self._writes.get(file_path)
+        if write:
+            return await asyncio.shield(write)  # The task that writes our data (or newer data)
+        return True
+
+    async def _write(self, file_path):
+        async with self._lock(file_path):
+            if file_path not in self._pending:
+                return True  # Already written together with a newer save
+            data = self._pending.pop(file_path)
+            if self._writes.get(file_path) is asyncio.current_task():
+                del self._writes[file_path]
+            try:
+                await run_io(save_yaml, file_path, data)
+            except Exception as e:
+                log.error("❌ Failed to save %s: %s", file_path, e)
+                return False
+            return True
+
+    def run(self, key, func, *args):
+        """ Runs func in the I/O threads in the background, after all other writes for `key`. """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return func(*args)
+
+        async def locked():
+            async with self._lock(key):
+                await run_io(func, *args)
+        self._start(locked())
+
+    async def wait_all(self):
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+file_writer = FileWriter()
 
 def get_server_file(guild_id, filename):
     return f"servers/{guild_id}/{filename}.yml"
 
-def load_premium_data():
-    """ Laadt de premium server data uit premium-servers.yml. """
-    if not os.path.exists(PREMIUM_FILE):
-        return {}  
+def split_server_file(file_path):
+    """ 'servers/<id>/<name>.yml' -> (guild id, name), None for all other files. """
+    parts = file_path.replace("\\", "/").split("/")
+    if len(parts) == 3 and parts[0] == DATA_FOLDER and parts[1].isdigit() and parts[2].endswith(".yml"):
+        return int(parts[1]), parts[2][:-len(".yml")]
+    return None
+
+
+# In-memory store for the per-server files (servers/<id>/<name>.yml)
+GUILD_CONFIG_FILES = ("bumps", "ad", "total-bumps", "special-managers")
+
+
+class YamlStorage:
+    """ Stores everything as yml files: servers/<id>/<name>.yml and the global files. """
+
+    def load(self, file_path):
+        return read_yaml_file(file_path)
 
-    with open(PREMIUM_FILE, "r", encoding="utf-8") as file:
+    def save(self, file_path, data):
+        write_yaml_file(file_path, data)
+
+    def load_guilds(self):
+        guilds = {}
+        for entry in os.listdir(DATA_FOLDER):
+            if not entry.isdigit():
+                continue
+            for name in GUILD_CONFIG_FILES:
+                path = get_server_file(entry, name)
+                if os.path.exists(path):
+                    guilds.setdefault(entry, {})[name] = read_yaml_file(path)
+        return guilds
+
+    def increment_bumps(self, guild_id, amount=1):
+        path = get_server_file(guild_id, "total-bumps")
+        count = read_yaml_file(path).get("count", 0) + amount
+        write_yaml_file(path, {"count": count})
+        return count
+
+    def top_bumps(self, limit):
+        counts = []
+        for entry in os.listdir(DATA_FOLDER):
+            if entry.isdigit():
+                counts.append((int(entry), read_yaml_file(get_server_file(entry, "total-bumps")).get("count", 0)))
+        return heapq.nlargest(limit, counts, key=lambda x: x[1])
+
+    def delete_guild(self, guild_id):
+        shutil.rmtree(os.path.join(DATA_FOLDER, str(guild_id)), ignore_errors=True)
+
+    def version(self, file_path):
+        """ Changes every time the file is written (also by hand or another process). """
+        try:
+            return os.stat(file_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def flush(self):
+        pass
+
+
+class SqliteStorage:
+    """ Stores everything in one SQLite database (WAL mode) instead of thousands of small files.
+
+    Server files go to the guild_config table, bump counts to bump_counts (indexed on count) and the
+    global files to documents. Writes are queued and committed in batches by a background thread,
+    reads also look in the queue so you always get back what you saved.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.RLock()  # Held while reading or committing, so a read never sees half a batch
+        self._pending = {}  # {("doc", path): data, ("inc", guild id): amount, ("del", guild id): True} waiting to be written
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS guild_config (
+                guild_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (guild_id, name)
+            );
+            CREATE TABLE IF NOT EXISTS bump_counts (
+                guild_id INTEGER PRIMARY KEY,
+                count INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS bump_counts_by_count ON bump_counts (count DESC);
+            CREATE TABLE IF NOT EXISTS documents (
+                name TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        if "version" not in [column[1] for column in connection.execute("PRAGMA table_info(documents)")]:
+            connection.execute("ALTER TABLE documents ADD COLUMN version INTEGER NOT NULL DEFAULT 0")  # Databases of older versions
+        connection.commit()
+        threading.Thread(target=self._write_loop, name="sqlite-writer", daemon=True).start()
+
+    def _connection(self):
+        # One connection per thread, SQLite connections can't be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _queue(self, key, value):
+        with self._lock:
+            self._pending[key] = value
+            self._idle.clear()
+        self._wake.set()
+
+    def load(self, file_path):
+        server_file = split_server_file(file_path)
+        connection = self._connection()
+        with self._lock:
+            queued = self._pending.get(("doc", file_path))
+            if server_file and server_file[1] == "total-bumps":
+                if queued is None and ("del", server_file[0]) in self._pending:
+                    queued = {}
+                elif queued is None:
+                    row = connection.execute("SELECT count FROM bump_counts WHERE guild_id = ?", (server_file[0],)).fetchone()
+                    queued = {"count": row[0]} if row else {}
+                increment = self._pending.get(("inc", server_file[0]), 0)
+                return {"count": queued.get("count", 0) + increment} if increment else dict(queued)
+            if queued is not None:
+                return copy.deepcopy(queued)
+            if server_file and ("del", server_file[0]) in self._pending:
+                return {}  # Deleted, not committed yet
+            if server_file:
+                row = connection.execute("SELECT data FROM guild_config WHERE guild_id = ? AND name = ?", server_file).fetchone()
+            else:
+                row = connection.execute("SELECT data FROM documents WHERE name = ?", (file_path,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def save(self, file_path, data):
+        server_file = split_server_file(file_path)
+        with self._lock:
+            if server_file and server_file[1] == "total-bumps":
+                self._pending.pop(("inc", server_file[0]), None)  # The saved count replaces earlier increments
+            self._queue(("doc", file_path), copy.deepcopy(data))
+
+    def load_guilds(self):
+        guilds = {}
+        connection = self._connection()
+        with self._lock:
+            for guild_id, name, data in connection.execute("SELECT guild_id, name, data FROM guild_config"):
+                guilds.setdefault(str(guild_id), {})[name] = json.loads(data)
+            for guild_id, count in connection.execute("SELECT guild_id, count FROM bump_counts"):
+                guilds.setdefault(str(guild_id), {})["total-bumps"] = {"count": count}
+            for kind, key in self._pending:
+                if kind == "del":
+                    guilds.pop(str(key), None)
+            for (kind, key), value in self._pending.items():
+                if kind == "doc" and split_server_file(key):
+                    guild_id, name = split_server_file(key)
+                    guilds.setdefault(str(guild_id), {})[name] = copy.deepcopy(value)
+            for (kind, key), value in self._pending.items():
+                if kind == "inc":
+                    counts = guilds.setdefault(str(key), {}).setdefault("total-bumps", {})
+                    counts["count"] = counts.get("count", 0) + value
+        return guilds
+
+    def increment_bumps(self, guild_id, amount=1):
+        with self._lock:
+            key = ("inc", guild_id)
+            self._queue(key, self._pending.get(key, 0) + amount)
+            return self.load(get_server_file(guild_id, "total-bumps")).get("count", 0)
+
+    def delete_guild(self, guild_id):
+        guild_id = int(guild_id)
+        with self._lock:
+            # Saves that are still queued for this server are dropped, saves after this are kept
+            for key in [key for key in self._pending if (key[0] == "inc" and key[1] == guild_id)
+                        or (key[0] == "doc" and (split_server_file(key[1]) or (None,))[0] == guild_id)]:
+                del self._pending[key]
+            self._queue(("del", guild_id), True)
+
+    def version(self, file_path):
+        """ Goes up every time a global file is written to the database (also by other processes). """
+        with self._lock:
+            row = self._connection().execute("SELECT version FROM documents WHERE name = ?", (file_path,)).fetchone()
+        return row[0] if row else None
+
+    def top_bumps(self, limit):
+        self.flush()
+        rows = self._connection().execute("SELECT guild_id, count FROM bump_counts ORDER BY count DESC LIMIT ?", (limit,))
+        return [(guild_id, count) for guild_id, count in rows]
+
+    def flush(self):
+        """ Waits until everything that was saved is in the database. """
+        self._idle.wait()
+
+    def _write_loop(self):
+        retry_delay = 0
+        while True:
+            self._wake.wait()
+            time.sleep(retry_delay or 0.05)  # Collect some more writes for the same transaction
+            with self._lock:
+                self._wake.clear()
+                batch, self._pending = self._pending, {}
+                try:
+                    self._write_batch(batch)
+                    retry_delay = 0
+                except sqlite3.Error as e:
+                    # Like "database is locked" when other processes use it too: keep the changes and try again
+                    retry_delay = min(retry_delay * 2 or 0.5, 30)
+                    log.error("❌ Failed to write %s changes to the database (trying again in %ss): %s", len(batch), retry_delay, e)
+                    self._pending = self._merge_failed(batch, self._pending)
+                    self._wake.set()
+                if not self._pending:
+                    self._idle.set()
+
+    @staticmethod
+    def _merge_failed(batch, pending):
+        """ Puts a batch that was not written back in front of the writes that were queued after it. """
+        deleted = {key for kind, key in pending if kind == "del"}
+        merged = {}
+        for (kind, key), value in batch.items():
+            server_file = split_server_file(key) if kind == "doc" else None
+            guild_id = server_file[0] if server_file else key
+            if kind != "del" and (kind == "inc" or server_file) and guild_id in deleted:
+                continue  # The server was deleted after this
+            if kind == "inc" and ("doc", get_server_file(key, "total-bumps")) in pending:
+                continue  # A saved count replaces earlier increments
+            merged[(kind, key)] = value
+        for key, value in pending.items():
+            if key[0] == "inc" and key in merged:
+                value += merged[key]  # Increments add up
+            merged.pop(key, None)  # Newer writes go after the old ones (after a delete of the same server)
+            merged[key] = value
+        return merged
+
+    def _write_batch(self, batch):
+        connection = self._connection()
+        with connection:  # One transaction for the whole batch
+            for (kind, key), value in batch.items():
+                if kind == "del":
+                    connection.execute("DELETE FROM guild_config WHERE guild_id = ?", (key,))
+                    connection.execute("DELETE FROM bump_counts WHERE guild_id = ?", (key,))
+                    continue
+                if kind == "inc":
+                    connection.execute(
+                        "INSERT INTO bump_counts (guild_id, count) VALUES (?, ?) "
+                        "ON CONFLICT (guild_id) DO UPDATE SET count = count + excluded.count",
+                        (key, value)
+                    )
+                    continue
+                server_file = split_server_file(key)
+                if server_file and server_file[1] == "total-bumps":
+                    connection.execute(
+                        "INSERT INTO bump_counts (guild_id, count) VALUES (?, ?) "
+                        "ON CONFLICT (guild_id) DO UPDATE SET count = excluded.count",
+                        (server_file[0], value.get("count", 0))
+                    )
+                elif server_file:
+                    connection.execute(
+                        "INSERT INTO guild_config (guild_id, name, data) VALUES (?, ?, ?) "
+                        "ON CONFLICT (guild_id, name) DO UPDATE SET data = excluded.data",
+                        (server_file[0], server_file[1], json.dumps(value))
+                    )
+                else:
+                    connection.execute(
+                        "INSERT INTO documents (name, data) VALUES (?, ?) "
+                        "ON CONFLICT (name) DO UPDATE SET data = excluded.data, version = documents.version + 1",
+                        (key, json.dumps(value))
+                    )
+
+
+def migrate_to_sqlite(db_path=STORAGE_DB):
+    """ One-shot copy of the servers/ folder and the global yml files into an SQLite database. """
+    target = SqliteStorage(db_path)
+    guilds = YamlStorage().load_guilds()
+    for guild_id, files in guilds.items():
+        for name, data in files.items():
+            target.save(get_server_file(guild_id, name), data)
+    for file_path in (BLOCKLIST_FILE, PREMIUM_FILE, AUTO_BUMP_FILE):
+        if os.path.exists(file_path):
+            target.save(file_path, read_yaml_file(file_path))
+    target.flush()
+    print(f"✅ Migrated {len(guilds)} servers to {db_path}.")
+
+
+storage = SqliteStorage(STORAGE_DB) if STORAGE_BACKEND == "sqlite" else YamlStorage()
+atexit.register(storage.flush)  # Don't lose queued writes when the bot stops
+
+class GuildConfigStore:
+    """ Keeps all servers/<id>/*.yml files in memory and writes changes back in the background. """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.data = {}  # {"<guild id>": {"bumps": {...}, "ad": {...}, ...}}
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def load_all(self):
+        if self.loaded:
+            return
+        with self._lock:
+            if not self.loaded:
+                self._load()
+
+    def _load(self):
+        data = timed_storage("load_guilds", storage.load_guilds)
+        self.data = data
+        self.loaded = True
+        log.info("📂 Loaded config of %s servers into memory.", len(data))
+
+    def get(self, guild_id, name):
+        self.load_all()  # Lazy load on first access
+        return self.data.get(str(guild_id), {}).get(name, {})
+
+    def set(self, guild_id, name, data):
+        self.load_all()
+        self.data.setdefault(str(guild_id), {})[name] = data
+        self._persist(get_server_file(guild_id, name), copy.deepcopy(data))
+
+    def increment_bumps(self, guild_id):
+        """ Adds one bump to the total of a server and returns the new total. """
+        count = self.get(guild_id, "total-bumps").get("count", 0) + 1
+        self.data.setdefault(str(guild_id), {})["total-bumps"] = {"count": count}
+        file_writer.run(get_server_file(guild_id, "total-bumps"), timed_storage, "increment_bumps", storage.increment_bumps, guild_id)
+        return count
+
+    def guild_ids(self):
+        self.load_all()
+        return list(self.data.keys())
+
+    def delete(self, guild_id):
+        """ Removes all data of a server (from memory and storage). """
+        self.load_all()
+        self.data.pop(str(guild_id), None)
+        file_writer.run(os.path.join(self.folder, str(guild_id)), timed_storage, "delete_guild", storage.delete_guild, guild_id)
+
+    def _persist(self, file_path, data):
+        file_writer.save(file_path, data)
+
+guild_config = GuildConfigStore(DATA_FOLDER)
+
+
+def get_valid_bump_channel(guild):
+    """ Returns the bump channel of a server if it exists, the bot can talk in it and the server is not blacklisted. """
+    if blocklist.is_blocked(guild.id):
+        return None
+    channel_id = guild_config.get(guild.id, "bumps").get("channel")
+    if not channel_id:
+        return None
+    channel = guild.get_channel(int(channel_id))
+    if not channel or not channel.permissions_for(guild.me).send_messages:
+        return None
+    return channel
+
+
+INVITE_PATTERN = re.compile(r"(?:https?://)?(?:www\.)?(?:discord\.gg|discord(?:app)?\.com/invite)/([A-Za-z0-9-]+)", re.IGNORECASE)
+
+
+class PreparedAd:
+    """ A checked advertisement that is ready to send. """
+
+    def __init__(self, content):
+        self.content = content
+        self.content_hash = hashlib.sha256(content.encode()).hexdigest()
+        self.invites = tuple(dict.fromkeys(INVITE_PATTERN.findall(content)))
+        self.allowed_mentions = AD_ALLOWED_MENTIONS
+
+
+def normalize_ad(text):
+    """ Strips trailing spaces, windows line endings and more than one empty line in a row. """
+    lines = [line.rstrip() for line in (text or "").replace("\r\n", "\n").split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def prepare_ad(text):
+    """ Returns (PreparedAd, None) for a valid ad and (None, error message) when it is not. """
+    content = normalize_ad(text)
+    if not content:
+        return None, "❌ Your advertisement is empty."
+    if len(content) < AD_MIN_LENGTH:
+        return None, f"❌ Your advertisement is too short (at least {AD_MIN_LENGTH} characters)."
+    if len(content) > AD_MAX_LENGTH:
+        return None, f"❌ Your advertisement is too long (max {AD_MAX_LENGTH} characters)."
+    return PreparedAd(content), None
+
+
+class AdCache:
+    """ Prepared ads of all servers, so a bump does not have to read and check the ad again.
+
+    Ads are shared by content hash (servers with the same ad use the same object) and servers
+    without a valid ad are remembered as None.
+    """
+
+    def __init__(self):
+        self.by_hash = {}  # {content hash: PreparedAd}
+        self.by_guild = {}  # {guild id: PreparedAd or None}
+
+    def get(self, guild_id):
+        guild_id = int(guild_id)
+        if guild_id not in self.by_guild:
+            # Ads saved before the ad was checked in /setup are checked on first use
+            ad, _ = prepare_ad(guild_config.get(guild_id, "ad").get("message"))
+            self.by_guild[guild_id] = self._share(ad)
+        return self.by_guild[guild_id]
+
+    def set(self, guild_id, ad):
+        guild_config.set(guild_id, "ad", {"message": ad.content})
+        self.by_guild[int(guild_id)] = self._share(ad)
+
+    def forget(self, guild_id):
+        self.by_guild.pop(int(guild_id), None)
+
+    def _share(self, ad):
+        if ad is None:
+            return None
+        ad = self.by_hash.setdefault(ad.content_hash, ad)
+        if len(self.by_hash) > 2 * max(len(self.by_guild), 100):
+            # Drop ads that no server uses anymore
+            used = {id(cached) for cached in self.by_guild.values()}
+            self.by_hash = {key: cached for key, cached in self.by_hash.items() if id(cached) in used or cached is ad}
+        return ad
+
+ad_cache = AdCache()
+
+
+class BumpTargetIndex:
+    """ All servers with a working bump channel, so a bump can pick its targets without checking every server. """
+
+    def __init__(self):
+        self.channels = {}  # {guild id: channel id}
+        self.guilds_by_channel = {}  # {channel id: guild id}
+        self._guild_ids = []  # Same guilds as a list, for random.sample
+        self._positions = {}  # {guild id: index in _guild_ids}
+
+    def __len__(self):
+        return len(self._guild_ids)
+
+    def add(self, guild_id, channel_id):
+        if guild_id not in self._positions:
+            self._positions[guild_id] = len(self._guild_ids)
+            self._guild_ids.append(guild_id)
+        old_channel_id = self.channels.get(guild_id)
+        if old_channel_id is not None:
+            self.guilds_by_channel.pop(old_channel_id, None)
+        self.channels[guild_id] = channel_id
+        self.guilds_by_channel[channel_id] = guild_id
+
+    def discard(self, guild_id):
+        position = self._positions.pop(guild_id, None)
+        if position is None:
+            return
+        # Swap with the last one so removing stays O(1)
+        last = self._guild_ids.pop()
+        if last != guild_id:
+            self._guild_ids[position] = last
+            self._positions[last] = position
+        channel_id = self.channels.pop(guild_id, None)
+        self.guilds_by_channel.pop(channel_id, None)
+
+    def refresh(self, guild):
+        channel = get_valid_bump_channel(guild)
+        if channel and not target_health.is_quarantined(guild.id):
+            self.add(guild.id, channel.id)
+        else:
+            self.discard(guild.id)
+
+    def rebuild(self, guilds):
+        self.channels.clear()
+        self.guilds_by_channel.clear()
+        self._guild_ids.clear()
+        self._positions.clear()
+        for guild in guilds:
+            self.refresh(guild)
+        log.info("🎯 %s servers can receive bumps.", len(self))
+
+    def sample(self, amount, exclude=None):
+        """ Picks up to `amount` random bump channel IDs, skipping the server `exclude` and blacklisted servers.
+        Servers that got an ad from `exclude` (the bumping server) in the last hours are only used when
+        there are not enough other servers. """
+        extra = 1 if exclude in self._positions else 0
+        blocked = blocklist.guild_ids  # Servers blocked after they were indexed (hot reload)
+        factor = 2
+        while True:
+            # Take more random servers than needed, more when too many of them already got this ad
+            size = min(factor * amount + extra, len(self._guild_ids))
+            picked = random.sample(self._guild_ids, size)
+            candidates = [g for g in picked if g != exclude and g not in blocked]
+            if exclude is None:
+                break
+            fresh, recent = [], []
+            for guild_id in candidates:
+                (recent if recent_deliveries.seen(exclude, guild_id) else fresh).append(guild_id)
+            candidates = fresh + recent
+            if len(fresh) >= amount or size == len(self._guild_ids) or factor >= 8:
+                break
+            factor *= 2
+        return [self.channels[g] for g in candidates[:amount]]
+
+bump_targets = BumpTargetIndex()
+
+
+class TargetHealth:
+    """ Failures in a row of every bump channel. A channel that fails (no permission, deleted) is taken out
+    of the bump targets for a while, every next failure doubles that time. A successful send resets it. """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.entries = {}  # {guild id: {"failures": n, "until": unix time, "notified": bool}}
+        self.heap = []  # (end of quarantine, guild id), outdated when "until" changed
+        self.notify_tasks = set()
+        self.loaded = False
+        self.dirty = False
+
+    def load(self):
+        if self.loaded:
+            return
         try:
-            return yaml.safe_load(file) or {} 
+            data = load_yaml(self.file_path) or {}
         except yaml.YAMLError:
-            return {}  # Prefent crashes when the file is corrupted
+            data = {}
+        for guild_id, entry in data.items():
+            self.entries[int(guild_id)] = dict(entry)
+            self.heap.append((entry.get("until", 0), int(guild_id)))
+        heapq.heapify(self.heap)
+        self.loaded = True
+
+    def is_quarantined(self, guild_id):
+        self.load()
+        entry = self.entries.get(guild_id)
+        return entry is not None and entry["until"] > time.time()
+
+    def record_failure(self, guild, reason):
+        self.load()
+        entry = self.entries.setdefault(guild.id, {"failures": 0, "until": 0, "notified": False})
+        if entry["until"] > time.time():
+            return  # Already quarantined, other sends of the same bump failed too
+        entry["failures"] += 1
+        quarantine = min(TARGET_QUARANTINE * 2 ** (entry["failures"] - 1), TARGET_MAX_QUARANTINE)
+        entry["until"] = time.time() + quarantine.total_seconds()
+        heapq.heappush(self.heap, (entry["until"], guild.id))
+        self.dirty = True
+        bump_targets.discard(guild.id)
+        log.warning("🚧 Bump channel of %s is quarantined for %s (%s)", guild.name, quarantine, reason)
+
+        if entry["failures"] >= TARGET_NOTIFY_AFTER and not entry["notified"]:
+            entry["notified"] = True
+            task = asyncio.create_task(notify_owner(guild, reason))
+            self.notify_tasks.add(task)
+            task.add_done_callback(self.notify_tasks.discard)
+
+    def record_success(self, guild_id):
+        if self.entries.pop(guild_id, None) is not None:
+            self.dirty = True
+
+    def reset(self, guild_id):
+        """ After /setup the server gets a clean start. """
+        self.load()
+        self.record_success(guild_id)
+
+    def release_due(self):
+        """ Puts servers whose quarantine is over back in the bump targets (when the channel looks fine now). """
+        self.load()
+        now = time.time()
+        while self.heap and self.heap[0][0] <= now:
+            until, guild_id = heapq.heappop(self.heap)
+            entry = self.entries.get(guild_id)
+            if entry is None or entry["until"] != until:
+                continue
+            guild = bot.get_guild(guild_id)
+            if guild:
+                bump_targets.refresh(guild)
+
+    async def flush(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        if not await file_writer.save_and_wait(self.file_path, {str(guild_id): dict(entry) for guild_id, entry in self.entries.items()}):
+            self.dirty = True  # Try again next time
+
+target_health = TargetHealth(TARGET_HEALTH_FILE)
+
+
+async def notify_owner(guild, reason):
+    """ Tells the server owner that bumps from other servers can't be posted in their bump channel. """
+    try:
+        owner = guild.owner or await bot.fetch_user(guild.owner_id)
+        await owner.send(
+            f"⚠️ I can't post bumps in **{guild.name}** anymore ({reason}).\n"
+            f"Please use `/setup` again and pick a channel where I can send messages."
+        )
+    except discord.HTTPException:
+        pass  # DMs closed
+
+
+@tasks.loop(minutes=1)
+async def check_target_health():
+    target_health.release_due()
+    await target_health.flush()
+
+
+class RecentDeliveries:
+    """ Which servers got an ad from which server in the last `window`, in fixed memory.
+
+    It is a Bloom filter of (source, target) pairs, split in time buckets: a pair is recent when one of
+    the buckets has it, and when a new bucket starts the oldest one is cleared. It can say a pair is
+    recent when it is not (rarely), but never the other way around.
+    """
+
+    HASHES = 4
+
+    def __init__(self, file_path, window=RECENT_DELIVERY_WINDOW, buckets=RECENT_DELIVERY_BUCKETS, bits=RECENT_DELIVERY_BITS):
+        self.file_path = file_path
+        self.bucket_seconds = window.total_seconds() / buckets
+        self.bits = bits
+        self.filters = [bytearray(bits // 8) for _ in range(buckets)]
+        self.bucket_ids = [None] * buckets  # Time bucket number each filter is for
+        self.loaded = False
+        self.dirty = False
+
+    def _positions(self, source, target):
+        digest = hashlib.blake2b(f"{source}:{target}".encode(), digest_size=4 * self.HASHES).digest()
+        return [int.from_bytes(digest[i:i + 4], "little") % self.bits for i in range(0, len(digest), 4)]
+
+    def _current(self):
+        bucket_id = int(time.time() // self.bucket_seconds)
+        index = bucket_id % len(self.filters)
+        if self.bucket_ids[index] != bucket_id:
+            self.filters[index] = bytearray(self.bits // 8)  # Older than the window, start over
+            self.bucket_ids[index] = bucket_id
+        return self.filters[index]
+
+    def add(self, source, target):
+        if source is None:
+            return
+        current = self._current()
+        for position in self._positions(source, target):
+            current[position >> 3] |= 1 << (position & 7)
+        self.dirty = True
+
+    def seen(self, source, target):
+        oldest = int(time.time() // self.bucket_seconds) - len(self.filters) + 1
+        positions = self._positions(source, target)
+        for bucket_id, bloom in zip(self.bucket_ids, self.filters):
+            if bucket_id is not None and bucket_id >= oldest and all(bloom[p >> 3] & (1 << (p & 7)) for p in positions):
+                return True
+        return False
+
+    def load(self):
+        if self.loaded:
+            return
+        try:
+            data = load_yaml(self.file_path) or {}
+        except yaml.YAMLError:
+            data = {}
+        if data.get("bits") == self.bits and data.get("bucket_seconds") == self.bucket_seconds:
+            for bucket in data.get("buckets", []):
+                index = bucket["id"] % len(self.filters)
+                self.bucket_ids[index] = bucket["id"]
+                self.filters[index] = bytearray(base64.b64decode(bucket["filter"]))
+        self.loaded = True
+
+    async def flush(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        data = {
+            "bits": self.bits,
+            "bucket_seconds": self.bucket_seconds,
+            "buckets": [
+                {"id": bucket_id, "filter": base64.b64encode(bloom).decode()}
+                for bucket_id, bloom in zip(self.bucket_ids, self.filters) if bucket_id is not None
+            ],
+        }
+        if not await file_writer.save_and_wait(self.file_path, data):
+            self.dirty = True  # Try again next time
+
+recent_deliveries = RecentDeliveries(RECENT_DELIVERIES_FILE)
+
+
+@tasks.loop(minutes=5)
+async def save_recent_deliveries():
+    await recent_deliveries.flush()
+
+
+class DeliveryResult:
+    """ Counts what happened while sending one advertisement. """
+
+    def __init__(self):
+        self.attempted = 0
+        self.delivered = 0
+        self.skipped = 0  # Channel was not found anymore
+        self.failed = 0
+        self.rate_limited = 0
+        self.duration = 0.0
+
+
+class BumpJob:
+    """ One bump message for one target channel. """
+
+    def __init__(self, source, channel, ad, result):
+        self.source = source
+        self.channel = channel
+        self.ad = ad
+        self.result = result
+        self.attempts = 0
+        self.done = asyncio.get_running_loop().create_future()
+
+
+class BumpScheduler:
+    """ One queue for every bump message the bot sends.
+
+    Every source server gets a turn in round-robin order and may send `weight` messages per turn,
+    so one big bump can't starve the others. Max `max_in_flight` messages are sent at the same time
+    and max `max_queued` wait in the queue (submit waits when it is full).
+    """
+
+    def __init__(self, max_in_flight=BUMP_CONCURRENCY, max_queued=BUMP_QUEUE_LIMIT):
+        self.max_in_flight = max_in_flight
+        self.queues = {}  # {source: deque of BumpJob}
+        self.weights = {}  # {source: messages per turn}
+        self.turn_order = deque()  # sources that have jobs waiting
+        self._turn_used = 0
+        self._room = asyncio.Semaphore(max_queued)
+        self._has_work = asyncio.Event()
+        self._workers = []
+
+    async def submit(self, job, weight=1):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_in_flight)]
+        await self._room.acquire()  # Backpressure: wait until there is room in the queue
+        self.weights[job.source] = weight
+        self._enqueue(job)
+
+    def _enqueue(self, job):
+        if job.source not in self.queues:
+            self.queues[job.source] = deque()
+            self.turn_order.append(job.source)
+        self.queues[job.source].append(job)
+        self._has_work.set()
+
+    async def _next_job(self):
+        while not self.turn_order:
+            self._has_work.clear()
+            await self._has_work.wait()
+
+        source = self.turn_order[0]
+        queue = self.queues[source]
+        job = queue.popleft()
+        self._turn_used += 1
+
+        if not queue:
+            # Nothing left for this source, give the turn to the next one
+            self.turn_order.popleft()
+            del self.queues[source]
+            self.weights.pop(source, None)
+            self._turn_used = 0
+        elif self._turn_used >= self.weights.get(source, 1):
+            self.turn_order.rotate(-1)
+            self._turn_used = 0
+        return job
+
+    async def _worker(self):
+        while True:
+            job = await self._next_job()
+            if job.done.done():
+                self._room.release()  # The bump was cancelled while this job was waiting
+                continue
+            try:
+                retry_after = await self._send(job)
+            except Exception:
+                # One bad job may not stop the worker (the pool is never refilled)
+                log.exception("❌ Bump queue worker failed on a job")
+                self._finish(job, False)
+                retry_after = None
+            if retry_after is None:
+                self._room.release()
+            else:
+                # Try again later without blocking this worker, the job keeps its spot in the queue limit
+                asyncio.get_running_loop().call_later(retry_after, self._enqueue, job)
+
+    async def _send(self, job):
+        """ Sends one job, returns the seconds to wait when it has to be retried. """
+        channel = job.channel
+        job.attempts += 1
+        retry_after = None
+        started = time.perf_counter()
+        try:
+            await channel.send(job.ad.content, allowed_mentions=job.ad.allowed_mentions)
+            metrics.send_latency.observe(time.perf_counter() - started)
+            metrics.send_results.inc("delivered")
+            target_health.record_success(channel.guild.id)
+            recent_deliveries.add(job.source, channel.guild.id)
+            job.result.delivered += 1
+            self._finish(job, True)
+            return None
+        except discord.RateLimited as e:
+            retry_after = e.retry_after
+        except discord.Forbidden:
+            metrics.send_results.inc("forbidden")
+            target_health.record_failure(channel.guild, "missing permissions")
+        except discord.NotFound:
+            metrics.send_results.inc("not_found")
+            target_health.record_failure(channel.guild, "channel not found")
+        except discord.HTTPException as e:
+            if e.status == 429:
+                retry_after = getattr(e, "retry_after", None) or 1.0
+            else:
+                metrics.send_results.inc("failed")
+                log.warning("❌ Failed to bump in %s: %s", channel.guild.name, e)
+        except Exception as e:
+            metrics.send_results.inc("failed")
+            log.warning("❌ Failed to bump in %s: %s", channel.guild.name, e)
+
+        if retry_after is not None:
+            metrics.send_results.inc("rate_limited")
+            job.result.rate_limited += 1
+            if job.attempts < BUMP_SEND_ATTEMPTS:
+                return retry_after
+            metrics.send_results.inc("failed")  # Out of tries
+
+        job.result.failed += 1
+        self._finish(job, False)
+        return None
+
+    @staticmethod
+    def _finish(job, delivered):
+        if not job.done.done():  # Cancelled when the bump that is waiting for it was cancelled
+            job.done.set_result(delivered)
+
+bump_scheduler = BumpScheduler()
+
+
+def get_bump_tier(guild_id):
+    return BUMP_TIERS["premium" if is_premium(guild_id) else "free"]
+
+
+async def deliver_ad(ad, channel_ids, source=None, weight=1, kind="bump"):
+    """ Puts an advertisement for all given channels in the bump queue and waits until it is sent.
+
+    discord.py already waits for the per-route and global rate limits, the queue only handles
+    the long waits it gives back to us (discord.RateLimited) and plain 429 errors.
+    """
+    if bump_queue:
+        result = await deliver_ad_with_workers(ad, channel_ids, source, weight)
+        metrics.fanout_duration.observe(result.duration, kind)
+        return result
+
+    result = DeliveryResult()
+    started = asyncio.get_running_loop().time()
+
+    jobs = []
+    for channel_id in channel_ids:
+        channel = bot.get_channel(channel_id)
+        if not channel:
+            result.skipped += 1
+            channel_missing(channel_id)
+            continue
+        result.attempted += 1
+        job = BumpJob(source, channel, ad, result)
+        await bump_scheduler.submit(job, weight)
+        jobs.append(job.done)
+
+    await asyncio.gather(*jobs)
+    result.duration = asyncio.get_running_loop().time() - started
+    metrics.fanout_duration.observe(result.duration, kind)
+    return result
+
+
+bump_queue = BumpQueue() if BUMP_WORKERS else None
+
+
+def channel_missing(channel_id):
+    """ A bump target that is not in the cache anymore (deleted while we missed the event). """
+    guild = bot.get_guild(bump_targets.guilds_by_channel.get(channel_id))
+    if guild:
+        target_health.record_failure(guild, "channel not found")
+
+
+async def deliver_ad_with_workers(ad, channel_ids, source=None, weight=1):
+    """ Puts an advertisement in the local work queue and waits until the bump workers have sent it. """
+    result = DeliveryResult()
+    started = asyncio.get_running_loop().time()
+
+    targets = []
+    for channel_id in channel_ids:
+        if bot.get_channel(channel_id):
+            targets.append(channel_id)
+        else:
+            result.skipped += 1
+            channel_missing(channel_id)
+    result.attempted = len(targets)
+
+    batch = uuid.uuid4().hex
+    await run_io(bump_queue.enqueue, batch, source or 0, ad.content, targets, weight)
+    counts = {}
+    while asyncio.get_running_loop().time() - started < BUMP_WORKER_TIMEOUT:
+        counts = await run_io(bump_queue.results, batch)
+        if sum(counts.get(status, 0) for status in DONE) >= len(targets):
+            break
+        await asyncio.sleep(0.5)
+
+    for channel_id in await run_io(bump_queue.channels, batch, FORBIDDEN):
+        channel = bot.get_channel(channel_id)
+        if channel:
+            target_health.record_failure(channel.guild, "missing permissions or channel not found")
+    for channel_id in await run_io(bump_queue.channels, batch, DELIVERED):
+        target_guild_id = bump_targets.guilds_by_channel.get(channel_id)
+        if target_guild_id:
+            target_health.record_success(target_guild_id)
+            recent_deliveries.add(source, target_guild_id)
+    await run_io(bump_queue.forget, batch)  # Jobs that did not finish in time are dropped
+
+    for status in (DELIVERED, FAILED, FORBIDDEN):
+        if counts.get(status):
+            metrics.send_results.inc(status, amount=counts[status])
+
+    result.delivered = counts.get(DELIVERED, 0)
+    result.failed = result.attempted - result.delivered
+    result.duration = asyncio.get_running_loop().time() - started
+    return result
+
+
+def load_premium_data():
+    """ Laadt de premium server data uit premium-servers.yml. """
+    try:
+        return load_yaml(PREMIUM_FILE)
+    except yaml.YAMLError:
+        return {}  # Prefent crashes when the file is corrupted
 
 def save_premium_data(data):
     """ Slaat de premium server data op in premium-servers.yml. """
-    with open(PREMIUM_FILE, "w", encoding="utf-8") as file:
-        yaml.dump(data, file, default_flow_style=False, allow_unicode=True)
+    save_yaml(PREMIUM_FILE, data)
+
+def get_premium_expiry(guild_info):
+    """ Geeft de verloopdatum (UTC) van een premium entry terug, of None als die er niet (goed) in staat. """
+    if not guild_info or "expires" not in guild_info:
+        return None
+
+    try:
+        return datetime.strptime(guild_info["expires"], "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+
+class WatchedYamlFile:
+    """ A yml file that is kept in memory and loaded again when it changes in the storage backend.
+
+    Lookups only use the memory copy, the watch_files loop checks the file in the I/O threads. Changes are
+    found with storage.version(): the file time for yml files, a version number in the database for sqlite
+    (with sqlite the .yml file on disk is not used anymore, change it with the commands).
+    """
+
+    check_interval = 30  # Seconds between checks if the file changed
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.loaded = False
+        self._version = None
+
+    def _storage_version(self):
+        return storage.version(self.file_path)
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.refresh()
+
+    def refresh(self):
+        version = self._storage_version()
+        if not self.loaded or version != self._version:
+            self._version = version
+            self.on_load(self.read())
+            self.loaded = True
+
+    def read(self):
+        return load_yaml(self.file_path)
+
+    def write(self, data):
+        file_writer.run(self.file_path, self._write, copy.deepcopy(data))
+
+    def _write(self, data):
+        save_yaml(self.file_path, data)
+        storage.flush()  # The sqlite backend writes in the background, wait for the new version
+        self._version = self._storage_version()  # Our own write is not a change we have to load again
+
+    def on_load(self, data):
+        raise NotImplementedError
+
+
+class PremiumRegistry(WatchedYamlFile):
+    """ premium-servers.yml in memory with parsed expiry dates and a min-heap of them, so expired servers
+    drop out without going through the whole list. """
+
+    def __init__(self, file_path):
+        super().__init__(file_path)
+        self.data = {}
+        self.expires = {}  # {guild id: expiry date (UTC)}
+        self.heap = []  # (expiry date, guild id)
+
+    def read(self):
+        return load_premium_data()
+
+    def _write(self, data):
+        save_premium_data(data)
+        storage.flush()
+        self._version = self._storage_version()
+
+    def on_load(self, data):
+        # Build everything first, this can run in an I/O thread while the bot reads the old values
+        expires = {}
+        for guild_id, guild_info in data.items():
+            expiry_date = get_premium_expiry(guild_info)
+            if str(guild_id).isdigit() and expiry_date:
+                expires[int(guild_id)] = expiry_date
+        heap = [(expiry_date, guild_id) for guild_id, expiry_date in expires.items()]
+        heapq.heapify(heap)
+        self.data, self.expires, self.heap = data, expires, heap
+
+    def _drop_expired(self):
+        now = datetime.utcnow()
+        while self.heap and self.heap[0][0] <= now:
+            expiry_date, guild_id = heapq.heappop(self.heap)
+            if self.expires.get(guild_id) == expiry_date:  # Could be an old entry of a server that got more days
+                del self.expires[guild_id]
+
+    def is_premium(self, guild_id):
+        self.ensure_loaded()
+        self._drop_expired()
+        return str(guild_id).isdigit() and int(guild_id) in self.expires
+
+    def get_expiry(self, guild_id):
+        return self.expires.get(int(guild_id)) if self.is_premium(guild_id) else None
+
+    def active_guilds(self):
+        self.ensure_loaded()
+        self._drop_expired()
+        return set(self.expires)
+
+    def grant(self, guild_id, expiry_date):
+        self.grant_many([guild_id], expiry_date)
+
+    def grant_many(self, guild_ids, expiry_date):
+        """ Gives all servers premium until expiry_date, with one write. """
+        self.ensure_loaded()
+        for guild_id in guild_ids:
+            self.data[str(guild_id)] = {"expires": expiry_date.strftime("%Y-%m-%d %H:%M:%S")}
+            expiry = get_premium_expiry(self.data[str(guild_id)])  # Same precision as in the file
+            self.expires[int(guild_id)] = expiry
+            heapq.heappush(self.heap, (expiry, int(guild_id)))
+        self.write(self.data)
+
+    def compact(self):
+        """ Removes expired servers from the file, returns how many were removed. """
+        self.ensure_loaded()
+        now = datetime.utcnow()
+        expired = {guild_id for guild_id, guild_info in self.data.items()
+                   if get_premium_expiry(guild_info) and get_premium_expiry(guild_info) <= now}
+        if expired:
+            self.data = {guild_id: guild_info for guild_id, guild_info in self.data.items() if guild_id not in expired}
+            self.write(self.data)
+        return len(expired)
+
+premium_registry = PremiumRegistry(PREMIUM_FILE)
+
+
+class Blocklist(WatchedYamlFile):
+    """ blocked-servers.yml in memory as a frozenset of guild IDs. Changes replace the whole set at once. """
+
+    def __init__(self, file_path):
+        super().__init__(file_path)
+        self.guild_ids = frozenset()
+
+    def on_load(self, data):
+        blocked = data.get("blacklisted") or []
+        self.guild_ids = frozenset(int(guild_id) for guild_id in blocked if str(guild_id).isdigit())
+
+    def is_blocked(self, guild_id):
+        self.ensure_loaded()
+        return str(guild_id).isdigit() and int(guild_id) in self.guild_ids
+
+    def add(self, guild_id):
+        """ Returns False when the server was already blocked. """
+        return bool(self.add_many([guild_id]))
+
+    def remove(self, guild_id):
+        """ Returns False when the server was not blocked. """
+        return bool(self.remove_many([guild_id]))
+
+    def add_many(self, guild_ids):
+        """ Blocks all servers with one write, returns the ones that were not blocked yet. """
+        self.ensure_loaded()
+        added = set(guild_ids) - self.guild_ids
+        if added:
+            self._save(self.guild_ids | added)
+        return added
+
+    def remove_many(self, guild_ids):
+        """ Unblocks all servers with one write, returns the ones that were blocked. """
+        self.ensure_loaded()
+        removed = set(guild_ids) & self.guild_ids
+        if removed:
+            self._save(self.guild_ids - removed)
+        return removed
+
+    def _save(self, guild_ids):
+        self.guild_ids = frozenset(guild_ids)
+        self.write({"blacklisted": sorted(self.guild_ids)})
+
+blocklist = Blocklist(BLOCKLIST_FILE)
+watched_files = [premium_registry, blocklist]
+
+
+@tasks.loop(seconds=WatchedYamlFile.check_interval)
+async def watch_files():
+    """ Loads the watched files again when they were changed on disk. """
+    for watched in watched_files:
+        await run_io(watched.refresh)
+
+
+class LoopLagMonitor:
+    """ Measures how long the event loop was blocked: it sleeps `interval` seconds and checks how late it wakes up. """
+
+    def __init__(self, interval=0.5, warn_after=0.25):
+        self.interval = interval
+        self.warn_after = warn_after
+        self.task = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            metrics.loop_lag.observe(lag)
+            if lag > self.warn_after:
+                log.warning("⚠️ Event loop was blocked for %.0fms", lag * 1000)
+
+loop_lag_monitor = LoopLagMonitor()
 
 
 class AdModal(discord.ui.Modal, title="📄 Enter Your Advertisement"):
@@ -152,8 +1526,7 @@ async def setup(interaction: Interaction):
     if not guild:
         return await interaction.response.send_message("❌ This command can only be used in a server.", ephemeral=True)
 
-    blocked_servers = load_yaml("blocked-servers.yml") or {"blacklisted": []}
-    if guild_id in blocked_servers["blacklisted"]:
+    if blocklist.is_blocked(guild_id):
         return await interaction.response.send_message("⛔️ This server is blacklisted. Please contact the support team with '/support'!", ephemeral=True)
 
     if not interaction.user.guild_permissions.manage_guild and interaction.user.id not in get_managers(guild.id):
@@ -172,7 +1545,9 @@ async def setup(interaction: Interaction):
     if not bump_channel.permissions_for(interaction.guild.me).send_messages:
         return await interaction.followup.send(f"❌ I don't have permission to send messages in <#{bump_channel.id}>. In order to set the server up, give me permission to talk in <#{bump_channel.id}>", ephemeral=True)
 
-    save_yaml(get_server_file(guild_id, "bumps"), {"channel": bump_channel.id})
+    guild_config.set(guild_id, "bumps", {"channel": bump_channel.id})
+    target_health.reset(guild_id)
+    bump_targets.refresh(guild)
 
     ad_view = AdInputView(interaction)
     await interaction.followup.send("📝 **Click below to enter your advertisement:**", view=ad_view, ephemeral=True)
@@ -181,13 +1556,92 @@ async def setup(interaction: Interaction):
     if not ad_view.selected_ad:
         return await interaction.followup.send("❌ Setup cancelled (no advertisement provided).", ephemeral=True)
 
-    save_yaml(get_server_file(guild_id, "ad"), {"message": ad_view.selected_ad})
+    ad, error = prepare_ad(ad_view.selected_ad)
+    if error:
+        return await interaction.followup.send(f"{error} Use `/setup` again to enter a new one.", ephemeral=True)
+    ad_cache.set(guild_id, ad)
 
     ad_view.stop() 
 
+    if not ad.invites:
+        await interaction.followup.send("⚠️ Your advertisement has no invite link, people that see it can't join your server!", ephemeral=True)
     await interaction.followup.send("✅ Setup completed successfully!", ephemeral=True)
     
-bump_cooldowns = {}
+class CooldownManager:
+    """ Bump cooldowns of all servers, saved to a file so they survive a restart.
+
+    `until` gives the remaining time of a server in O(1), the min-heap (end time, guild id) is used
+    to drop cooldowns that ended, so only servers that are on cooldown are kept in memory.
+    Changes are written in batches by flush_bump_cooldowns.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.until = {}  # {guild id: unix time when the cooldown ends}
+        self.heap = []  # (end time, guild id), entries with another end time than `until` are outdated
+        self.loaded = False
+        self.dirty = False
+
+    def load(self):
+        if self.loaded:
+            return
+        now = time.time()
+        try:
+            data = load_yaml(self.file_path) or {}
+        except yaml.YAMLError:
+            data = {}
+        for guild_id, ends_at in data.items():
+            if float(ends_at) > now:
+                self.until[int(guild_id)] = float(ends_at)
+                self.heap.append((float(ends_at), int(guild_id)))
+        heapq.heapify(self.heap)
+        self.loaded = True
+
+    def remaining(self, guild_id):
+        """ Seconds until the server can bump again (0 when it can bump now). """
+        self.load()
+        return max(0.0, self.until.get(guild_id, 0.0) - time.time())
+
+    def reserve(self, guild_id, seconds):
+        """ Starts the cooldown when the server is not on cooldown and returns 0, otherwise returns
+        the remaining seconds. Done before the bump is sent, so a second /bump can't run at the same time. """
+        remaining = self.remaining(guild_id)
+        if remaining:
+            return remaining
+        self.evict()
+        ends_at = time.time() + seconds
+        self.until[guild_id] = ends_at
+        heapq.heappush(self.heap, (ends_at, guild_id))
+        self.dirty = True
+        return 0.0
+
+    def release(self, guild_id):
+        """ Gives the cooldown back, for bumps that could not be sent. """
+        if self.until.pop(guild_id, None) is not None:
+            self.dirty = True
+
+    def evict(self):
+        now = time.time()
+        while self.heap and self.heap[0][0] <= now:
+            ends_at, guild_id = heapq.heappop(self.heap)
+            if self.until.get(guild_id) == ends_at:
+                del self.until[guild_id]
+
+    async def flush(self):
+        self.evict()
+        if not self.dirty:
+            return
+        self.dirty = False
+        if not await file_writer.save_and_wait(self.file_path, {str(guild_id): ends_at for guild_id, ends_at in self.until.items()}):
+            self.dirty = True  # Try again next time
+
+bump_cooldowns = CooldownManager(COOLDOWN_FILE)
+
+
+@tasks.loop(seconds=30)
+async def flush_bump_cooldowns():
+    await bump_cooldowns.flush()
+
 
 @bot.tree.command(name="bump", description="Send your advertisement to other servers.")
 async def bump(interaction: Interaction):
@@ -196,67 +1650,58 @@ async def bump(interaction: Interaction):
     guild_id = guild.id
 
     if is_blacklisted(guild_id):
-        return await interaction.response.send_message("⛔️ This server is blacklisted. Please contact the support team with '/support'.", ephemeral=True)
+        return await interaction.followup.send("⛔️ This server is blacklisted. Please contact the support team with '/support'.", ephemeral=True)
 
     # Cooldown check
-    now = datetime.utcnow()
-    cooldown_time = timedelta(minutes=60 if not is_premium(guild_id) else 45)
-
-    if guild_id in bump_cooldowns and bump_cooldowns[guild_id] > now:
-        remaining = bump_cooldowns[guild_id] - now
-        return await interaction.response.send_message(
-            f"⏳ You must wait {remaining.seconds // 60} minutes before bumping again. Want faster cooldowns? Purchage premium", ephemeral=True
+    tier = get_bump_tier(guild_id)
+    remaining = bump_cooldowns.remaining(guild_id)
+    if remaining:
+        return await interaction.followup.send(
+            f"⏳ You must wait {int(remaining) // 60} minutes before bumping again. Want faster cooldowns? Purchage premium", ephemeral=True
         )
 
-    ad_data = load_yaml(get_server_file(guild_id, "ad"))
-    bump_data = load_yaml(get_server_file(guild_id, "bumps"))
-
-    ad_message = ad_data.get("message")
+    ad = ad_cache.get(guild_id)
+    bump_data = guild_config.get(guild_id, "bumps")
     bump_channel_id = bump_data.get("channel")
 
     if not bump_channel_id:
-        return await interaction.response.send_message(
+        return await interaction.followup.send(
             "❌ No bump channel is set up. Use `/setup` first.", ephemeral=True
         )
 
     channel = guild.get_channel(bump_channel_id)
 
     if not channel:
-        return await interaction.response.send_message(
+        return await interaction.followup.send(
             "❌ I didn't found the bump channel.. Please use `/setup` again.", ephemeral=True
         )
 
     if not channel.permissions_for(guild.me).send_messages:
-        return await interaction.response.send_message(
+        return await interaction.followup.send(
             "❌ I don't have permission to send messages in the bump channel! In order to use the /bump command, please give me permission to talk in your bump channel.", ephemeral=True
         )
 
-    all_servers = [g for g in bot.guilds if g.id != guild_id]
-    random.shuffle(all_servers) 
-    target_servers = all_servers[:random.randint(50, 100)]
+    if not ad:
+        return await interaction.followup.send("❌ No valid advertisement is set up. Use `/setup` first.", ephemeral=True)
 
-    sent_count = 0
-    for i, target_guild in enumerate(target_servers):
-        target_bump_data = load_yaml(get_server_file(target_guild.id, "bumps"))
-        target_channel_id = target_bump_data.get("channel")
-
-        if target_channel_id:
-            target_channel = bot.get_channel(int(target_channel_id))
-            if target_channel:
-                try:
-                    await target_channel.send(ad_message)
-                    sent_count += 1
-                except discord.Forbidden:
-                    print(f"❌ Cannot send message in {target_guild.name} (missing permissions)")
+    # Reserve the cooldown before sending, a second /bump while this one is sending gets the cooldown message
+    remaining = bump_cooldowns.reserve(guild_id, tier["cooldown"] * 60)
+    if remaining:
+        return await interaction.followup.send(
+            f"⏳ You must wait {int(remaining) // 60} minutes before bumping again. Want faster cooldowns? Purchage premium", ephemeral=True
+        )
 
-        if (i + 1) % 20 == 0:
-            await asyncio.sleep(10)
+    target_channel_ids = bump_targets.sample(random.randint(50, 100), exclude=guild_id)
 
-    bump_cooldowns[guild_id] = now + cooldown_time
+    try:
+        delivery = await deliver_ad(ad, target_channel_ids, source=guild_id, weight=tier["weight"])
+    except Exception:
+        bump_cooldowns.release(guild_id)
+        raise
+    sent_count = delivery.delivered
 
-    total_bumps_data = load_yaml(get_server_file(guild_id, "total-bumps"))
-    total_bumps = total_bumps_data.get("count", 0) + 1
-    save_yaml(get_server_file(guild_id, "total-bumps"), {"count": total_bumps})
+    total_bumps = guild_config.increment_bumps(guild_id)
+    bump_leaderboard.record(guild_id, total_bumps)
 
     embed = discord.Embed(
         title="✅ Successful Bump!",
@@ -271,18 +1716,10 @@ async def bump(interaction: Interaction):
         await interaction.followup.send(embed=embed)
 
 def get_managers(server_id):
-    file_path = f"servers/{server_id}/special-managers.yml"
-    if not os.path.exists(file_path):
-        return []
-    with open(file_path, "r") as f:
-        data = yaml.safe_load(f) or {}
-    return data.get("managers", [])
+    return list(guild_config.get(server_id, "special-managers").get("managers", []))
 
 def save_managers(server_id, managers):
-    file_path = f"servers/{server_id}/special-managers.yml"
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, "w") as f:
-        yaml.dump({"managers": managers}, f)
+    guild_config.set(server_id, "special-managers", {"managers": list(managers)})
         
 # ✅ /addmanager <user>
 @bot.tree.command(name="addmanager", description="Add a manager for this server")
@@ -326,16 +1763,124 @@ async def removemanager(interaction: discord.Interaction, user: discord.User):
 
     await interaction.response.send_message(f"✅ {user.mention} has been removed as a manager!", ephemeral=False)
     
+LEADERBOARD_SIZE = 10
+LEADERBOARD_WINDOWS = {"hour": "%Y-%m-%d %H", "day": "%Y-%m-%d"}  # Window name: time format that changes when a new window starts (UTC)
+LEADERBOARD_WINDOW_LENGTHS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+class TopCounter:
+    """ Bump counts with the top `size` servers kept sorted. Counts only go up, so the top list stays correct
+    by only looking at the server that was just bumped. """
+
+    def __init__(self, size):
+        self.size = size
+        self.counts = {}  # {guild id: count}
+        self.top = []  # Sorted list of (-count, guild id), max `size` entries
+
+    def load(self, counts):
+        self.counts = dict(counts)
+        self.top = sorted((-count, guild_id) for guild_id, count in self.counts.items())[:self.size]
+
+    def set(self, guild_id, count):
+        old = self.counts.get(guild_id)
+        self.counts[guild_id] = count
+        if old is not None:
+            position = bisect.bisect_left(self.top, (-old, guild_id))
+            if position < len(self.top) and self.top[position] == (-old, guild_id):
+                del self.top[position]
+        bisect.insort(self.top, (-count, guild_id))
+        del self.top[self.size:]
+
+    def add(self, guild_id, amount=1):
+        self.set(guild_id, self.counts.get(guild_id, 0) + amount)
+
+    def get_top(self):
+        return [(guild_id, -count) for count, guild_id in self.top]
+
+
+class BumpLeaderboard:
+    """ All-time bump counts plus counters for the current hour and day. When a window is over its top
+    list is kept as a snapshot (last hour / yesterday). """
+
+    def __init__(self, size=LEADERBOARD_SIZE):
+        self.size = size
+        self.loaded = False
+        self.all_time = TopCounter(size)
+        self.windows = {name: TopCounter(size) for name in LEADERBOARD_WINDOWS}
+        self.window_keys = {name: None for name in LEADERBOARD_WINDOWS}
+        self.snapshots = {name: [] for name in LEADERBOARD_WINDOWS}
+
+    def load(self):
+        # Only the current top is needed, counts only go up and record() gets the new total.
+        # The counts are already in memory in guild_config, so no file is read again.
+        guild_config.load_all()
+        counts = ((int(guild_id), config.get("total-bumps", {}).get("count", 0)) for guild_id, config in guild_config.data.items())
+        self.all_time.load(dict(heapq.nlargest(self.size, counts, key=lambda x: x[1])))
+        self.loaded = True
+
+    def refresh(self, top_counts):
+        """ Takes over the counts of servers that were bumped by the other shard processes. """
+        for guild_id, count in top_counts:
+            if count > self.all_time.counts.get(int(guild_id), 0):
+                self.all_time.set(int(guild_id), count)
+
+    def _rotate(self):
+        now = datetime.utcnow()
+        for name, time_format in LEADERBOARD_WINDOWS.items():
+            key = now.strftime(time_format)
+            if self.window_keys[name] != key:
+                # Only the window right before this one is "last hour"/"yesterday", not one from longer ago
+                previous_key = (now - LEADERBOARD_WINDOW_LENGTHS[name]).strftime(time_format)
+                self.snapshots[name] = self.windows[name].get_top() if self.window_keys[name] == previous_key else []
+                self.windows[name] = TopCounter(self.size)
+                self.window_keys[name] = key
+
+    def record(self, guild_id, total_bumps):
+        if not self.loaded:
+            self.load()
+        self._rotate()
+        self.all_time.set(guild_id, total_bumps)
+        for counter in self.windows.values():
+            counter.add(guild_id)
+
+    def get_top(self, period="all-time"):
+        """ period is 'all-time', a window name ('hour', 'day') or 'last-<window>'. """
+        if not self.loaded:
+            self.load()
+        self._rotate()
+        if period == "all-time":
+            return self.all_time.get_top()
+        if period.startswith("last-"):
+            return self.snapshots[period[len("last-"):]]
+        return self.windows[period].get_top()
+
+bump_leaderboard = BumpLeaderboard()
+
+
+@tasks.loop(minutes=10)
+async def refresh_leaderboard():
+    """ Only when the bot runs in more processes, they all write bump counts to the storage. """
+    bump_leaderboard.refresh(await run_io(timed_storage, "top_bumps", storage.top_bumps, LEADERBOARD_SIZE))
+
+
 # ✅ `/leaderboard`
 @bot.tree.command(name="leaderboard", description="Show the top 10 servers with the most bumps.")
-async def leaderboard(interaction: Interaction):
+@app_commands.describe(period="Which bumps to count (default: all time)")
+@app_commands.choices(period=[
+    app_commands.Choice(name="All time", value="all-time"),
+    app_commands.Choice(name="This hour", value="hour"),
+    app_commands.Choice(name="Last hour", value="last-hour"),
+    app_commands.Choice(name="Today", value="day"),
+    app_commands.Choice(name="Yesterday", value="last-day"),
+])
+async def leaderboard(interaction: Interaction, period: Optional[app_commands.Choice[str]] = None):
     if is_blacklisted(interaction.guild.id):
         return await interaction.response.send_message("⛔️ This server is blacklisted. Please contact our support team with '/support'.", ephemeral=True)
 
-    servers = {s: load_yaml(get_server_file(s, "total-bumps")).get("count", 0) for s in os.listdir("servers") if s.isdigit()}
-    top_servers = sorted(servers.items(), key=lambda x: x[1], reverse=True)[:10]
+    top_servers = bump_leaderboard.get_top(period.value if period else "all-time")
 
-    embed = discord.Embed(title="📊 Bump Leaderboard", color=discord.Color.blue())
+    title = "📊 Bump Leaderboard" if not period else f"📊 Bump Leaderboard ({period.name})"
+    embed = discord.Embed(title=title, color=discord.Color.blue())
     for i, (server_id, count) in enumerate(top_servers, 1):
         embed.add_field(name=f"#{i}", value=f"Server ID: {server_id} - {count} bumps", inline=False)
 
@@ -353,13 +1898,9 @@ async def blacklist(interaction: Interaction, server_id: str):
         return await interaction.response.send_message("❌ Invalid server ID.", ephemeral=True)
 
     guild_id = int(server_id)
-    file_path = "blocked-servers.yml"
 
-    # Load blacklist
-    blocked = load_yaml(file_path) or {"blacklisted": []}
-    if guild_id not in blocked["blacklisted"]:
-        blocked["blacklisted"].append(guild_id)
-        save_yaml(file_path, blocked)
+    if blocklist.add(guild_id):
+        bump_targets.discard(guild_id)
         await interaction.response.send_message(f"✅ Server **{guild_id}** has been blacklisted.", ephemeral=True)
     else:
         await interaction.response.send_message("⚠️ This server is already blacklisted.", ephemeral=True)
@@ -376,34 +1917,22 @@ async def remove_blacklist(interaction: Interaction, server_id: str):
         return await interaction.response.send_message("❌ Invalid server ID.", ephemeral=True)
 
     guild_id = int(server_id)
-    file_path = "blocked-servers.yml"
 
-    # Load the blacklist
-    blocked = load_yaml(file_path) or {"blacklisted": []}
-    if guild_id in blocked["blacklisted"]:
-        blocked["blacklisted"].remove(guild_id)
-        save_yaml(file_path, blocked)
+    if blocklist.remove(guild_id):
+        guild = bot.get_guild(guild_id)
+        if guild:
+            bump_targets.refresh(guild)
         await interaction.response.send_message(f"✅ Server **{guild_id}** has been removed from the blacklist.", ephemeral=True)
     else:
         await interaction.response.send_message("⚠️ This server is not blacklisted.", ephemeral=True)
 
 @bot.tree.command(name="premium", description="Get premium")
 async def premium(interaction: discord.Interaction):
-    embed = discord.Embed(
-        title="💎 Get Premium!",
-        description="Unlock premium benefits for your server!\n[Join our support server](https://discord.gg/eDMGawH7HH)",
-        color=discord.Color.gold()
-    )
-    await interaction.response.send_message(embed=embed)
+    await interaction.response.send_message(embed=get_embed("premium"))
 
 @bot.tree.command(name="support", description="Get the invite to our support server")
 async def support(interaction: discord.Interaction):
-    embed = discord.Embed(
-        title="🆘 Support Server",
-        description="Need help? Join our support server:\n[Click here](https://discord.gg/eDMGawH7HH)",
-        color=discord.Color.blue()
-    )
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    await interaction.response.send_message(embed=get_embed("support"), ephemeral=True)
 
 
 @bot.tree.command(name="grand-premium", description="Grant a server premium status for a set number of days.")
@@ -419,29 +1948,142 @@ async def set_premium(interaction: Interaction, server_id: str, days: int):
     guild_id = str(server_id)  
     expiry_date = datetime.utcnow() + timedelta(days=days)
 
-    premium_data = load_premium_data()
-    premium_data[guild_id] = {"expires": expiry_date.strftime("%Y-%m-%d %H:%M:%S")}
-    save_premium_data(premium_data)
+    premium_registry.grant(guild_id, expiry_date)
 
     await interaction.response.send_message(
         f"✅ Server **{guild_id}** is now premium until **{expiry_date} UTC**!", ephemeral=True
     )
 
-def is_premium(guild_id):
-    """ Checkt of een server premium is door de verloopdatum te controleren. """
-    premium_data = load_premium_data()
-    guild_info = premium_data.get(str(guild_id))
+async def collect_server_ids(server_ids, file):
+    """ Server IDs from the text and/or an uploaded file (spaces, commas or new lines between them).
+    Returns (ids, invalid parts), raises ValueError when the list is too big. """
+    text = server_ids or ""
+    if file:
+        if file.size > BULK_FILE_LIMIT:
+            raise ValueError(f"The file is too big (max {BULK_FILE_LIMIT // 1024} KB).")
+        text += "\n" + (await file.read()).decode("utf-8", errors="ignore")
+
+    ids, invalid = [], []
+    for part in re.split(r"[\s,;]+", text):
+        part = part.strip("-'\"")
+        if not part:
+            continue
+        if part.isdigit():
+            ids.append(int(part))
+        else:
+            invalid.append(part)
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > BULK_ID_LIMIT:
+        raise ValueError(f"Too many server IDs (max {BULK_ID_LIMIT} at once).")
+    return ids, invalid
+
+
+def invalid_ids_text(invalid):
+    if not invalid:
+        return ""
+    return f"\n❌ {len(invalid)} invalid IDs ignored: {', '.join(invalid[:10])}{' ...' if len(invalid) > 10 else ''}"
+
+
+def bulk_summary(done, total, action, skipped_reason, invalid):
+    message = f"✅ {action} **{done}** of {total} servers."
+    if total - done:
+        message += f"\n⚠️ {total - done} {skipped_reason}."
+    return message + invalid_ids_text(invalid)
+
+
+@bot.tree.command(name="blacklist-bulk", description="Blacklist many servers at once (IDs or a file with IDs).")
+@app_commands.describe(server_ids="Server IDs with spaces or commas between them", file="A .txt file with server IDs")
+async def blacklist_bulk(interaction: Interaction, server_ids: Optional[str] = None, file: Optional[discord.Attachment] = None):
+    if interaction.user.id not in OWNER_IDS:
+        return await interaction.response.send_message("⛔️ You do not have permission to use this command.", ephemeral=True)
 
-    if not guild_info or "expires" not in guild_info:
-        return False  
+    await interaction.response.defer(ephemeral=True)
+    try:
+        guild_ids, invalid = await collect_server_ids(server_ids, file)
+    except ValueError as e:
+        return await interaction.followup.send(f"❌ {e}", ephemeral=True)
 
-    expiry_str = guild_info["expires"]
-    
+    added = blocklist.add_many(guild_ids)
+    for guild_id in added:
+        bump_targets.discard(guild_id)
+    await interaction.followup.send(bulk_summary(len(added), len(guild_ids), "Blacklisted", "were already blacklisted", invalid), ephemeral=True)
+
+
+@bot.tree.command(name="removeblacklist-bulk", description="Remove many servers from the blacklist at once (IDs or a file with IDs).")
+@app_commands.describe(server_ids="Server IDs with spaces or commas between them", file="A .txt file with server IDs")
+async def remove_blacklist_bulk(interaction: Interaction, server_ids: Optional[str] = None, file: Optional[discord.Attachment] = None):
+    if interaction.user.id not in OWNER_IDS:
+        return await interaction.response.send_message("⛔️ You do not have permission to use this command.", ephemeral=True)
+
+    await interaction.response.defer(ephemeral=True)
+    try:
+        guild_ids, invalid = await collect_server_ids(server_ids, file)
+    except ValueError as e:
+        return await interaction.followup.send(f"❌ {e}", ephemeral=True)
+
+    removed = blocklist.remove_many(guild_ids)
+    for guild_id in removed:
+        guild = bot.get_guild(guild_id)
+        if guild:
+            bump_targets.refresh(guild)
+    await interaction.followup.send(bulk_summary(len(removed), len(guild_ids), "Removed from the blacklist:", "were not blacklisted", invalid), ephemeral=True)
+
+
+@bot.tree.command(name="grand-premium-bulk", description="Grant many servers premium status at once (IDs or a file with IDs).")
+@app_commands.describe(days="Days of premium", server_ids="Server IDs with spaces or commas between them", file="A .txt file with server IDs")
+async def set_premium_bulk(interaction: Interaction, days: int, server_ids: Optional[str] = None, file: Optional[discord.Attachment] = None):
+    if interaction.user.id not in OWNER_IDS:
+        return await interaction.response.send_message("❌ You do not have permission to use this command.", ephemeral=True)
+
+    await interaction.response.defer(ephemeral=True)
     try:
-        expiry_date = datetime.strptime(expiry_str, "%Y-%m-%d %H:%M:%S")
-        return expiry_date > datetime.utcnow()
-    except ValueError:
-        return False  
+        guild_ids, invalid = await collect_server_ids(server_ids, file)
+    except ValueError as e:
+        return await interaction.followup.send(f"❌ {e}", ephemeral=True)
+
+    expiry_date = datetime.utcnow() + timedelta(days=days)
+    if guild_ids:
+        premium_registry.grant_many(guild_ids, expiry_date)
+    await interaction.followup.send(
+        f"✅ **{len(guild_ids)}** servers are now premium until **{expiry_date} UTC**!" + invalid_ids_text(invalid), ephemeral=True
+    )
+
+
+left_servers_since = {}  # {guild id: first time compact_data saw the bot is not in it anymore}
+
+
+@tasks.loop(seconds=COMPACT_INTERVAL.total_seconds())
+async def compact_data():
+    """ Keeps the data small: removes expired premium servers and the data of servers the bot left. """
+    if bot.shard_ids is None or 0 in bot.shard_ids:  # The premium file is shared, one process cleans it
+        expired = premium_registry.compact()
+        if expired:
+            log.info("🧹 Removed %s expired premium servers.", expired)
+
+    now = time.time()
+    known = set()
+    removed = 0
+    for guild_id in map(int, guild_config.guild_ids()):
+        if not is_local_guild(guild_id):
+            continue  # Another process knows if the bot is still in it
+        known.add(guild_id)
+        if bot.get_guild(guild_id):
+            left_servers_since.pop(guild_id, None)
+        elif now - left_servers_since.setdefault(guild_id, now) >= LEFT_SERVER_GRACE.total_seconds():
+            guild_config.delete(guild_id)
+            ad_cache.forget(guild_id)
+            target_health.record_success(guild_id)  # Drops its health entry
+            left_servers_since.pop(guild_id, None)
+            removed += 1
+    for guild_id in set(left_servers_since) - known:
+        del left_servers_since[guild_id]
+    if removed:
+        log.info("🧹 Removed the data of %s servers the bot left more than %s days ago.", removed, LEFT_SERVER_GRACE.days)
+
+
+def is_premium(guild_id):
+    """ Checkt of een server premium is door de verloopdatum te controleren. """
+    return premium_registry.is_premium(guild_id)
 
 
 # ✅
@@ -450,19 +2092,111 @@ VOTE_LINKS = [
     {"name": "Top.gg", "url": "https://top.gg/bot/1344683872159531090"},
 ]
 
-@bot.tree.command(name="vote", description="Vote for us!")
-async def vote(interaction: Interaction):
-    embed = discord.Embed(
+
+# Embeds that are always the same are built once here, commands only fill in the footer when needed
+def build_static_embeds():
+    embeds = {}
+
+    embeds["premium"] = discord.Embed(
+        title="💎 Get Premium!",
+        description="Unlock premium benefits for your server!\n[Join our support server](https://discord.gg/eDMGawH7HH)",
+        color=discord.Color.gold()
+    )
+
+    embeds["support"] = discord.Embed(
+        title="🆘 Support Server",
+        description="Need help? Join our support server:\n[Click here](https://discord.gg/eDMGawH7HH)",
+        color=discord.Color.blue()
+    )
+
+    embeds["vote"] = discord.Embed(
         title="🗳️ Vote for us!",
         description="Already, thanks for voting! Below are some links to vote for us and support the server.",
         color=discord.Color.blue(),
     )
-
     for link in VOTE_LINKS:
-        embed.add_field(name=link["name"], value=f"[Click here to vote]({link['url']})", inline=False)
+        embeds["vote"].add_field(name=link["name"], value=f"[Click here to vote]({link['url']})", inline=False)
 
-    await interaction.response.send_message(embed=embed)
+    embeds["info-commands"] = discord.Embed(title="📩 Info Commands", description="You can DM me with the following commands:", color=discord.Color.blue())
+    embeds["info-commands"].add_field(name="📨 `!suggest <suggestion>`", value="Send a suggestion to the developers!", inline=False)
+    embeds["info-commands"].add_field(name="💰 `!paidpromo`", value="Get info about hosting a paid promo in our support server.", inline=False)
+    embeds["info-commands"].add_field(name="❓ `!help`", value="This is the main help command.", inline=False)
+
+    embeds["paidpromo"] = discord.Embed(title="💰 Paid Promotion", description="Want to promote your server with a paid promo? Here’s how it works!", color=discord.Color.gold())
+    embeds["paidpromo"].add_field(name="📢 What is a paid promo?", value="A paid promo let you host a giveaway in the support server. The members first need to join your server before they can win. This makes your server growth go INSANE!", inline=False)
+    embeds["paidpromo"].add_field(name="💵 Pricing & Details", value="Join our support server and create a support ticket for more info: [Support Server](https://discord.gg/eDMGawH7HH)", inline=False)
+
+    embeds["help"] = discord.Embed(title="❓ Help Command", description="Here are some useful commands you can use:", color=discord.Color.blue())
+    embeds["help"].add_field(name="📩 `!suggest <suggestion>` *only works in DMs to me!*", value="Submit a suggestion to the developers.", inline=False)
+    embeds["help"].add_field(name="💰 `!paidpromo` *only works in DMs to me!*", value="Get info about hosting a paid promo.", inline=False)
+    embeds["help"].add_field(name="🔹 `/bump`", value="Manually bump your server.", inline=False)
+    embeds["help"].add_field(name="🔸 `/setup`", value="Set up the bot for your server.", inline=False)
+    embeds["help"].add_field(name="📈 `/leaderboard`", value="View the top 10 most active bump servers.")
+    embeds["help"].add_field(name="🛠️ `/addmanager`, `/removemanager`", value="Add managers to your server that can run '/setup'.")
+
+    return embeds
+
+STATIC_EMBEDS = build_static_embeds()
+
+def get_embed(name, footer=None, icon_url=None):
+    """ Returns a prebuilt embed. With a footer you get a copy, the prebuilt one is never changed. """
+    embed = STATIC_EMBEDS[name]
+    if footer:
+        embed = embed.copy()
+        embed.set_footer(text=footer, icon_url=icon_url)
+    return embed
+
+
+@bot.tree.command(name="vote", description="Vote for us!")
+async def vote(interaction: Interaction):
+    await interaction.response.send_message(embed=get_embed("vote"))
     
+class TTLCache:
+    """ Small LRU cache where every entry also expires after `ttl` seconds. """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # {key: (expires at, value)}, oldest used first
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+        if entry[0] <= time.monotonic():
+            del self.entries[key]
+            return default
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value, ttl=None):
+        self.entries[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+INVALID_INVITE = object()  # Cached for invites that don't exist, so we don't ask Discord again right away
+invite_cache = TTLCache(maxsize=1000, ttl=600)
+INVALID_INVITE_TTL = 60
+
+
+async def lookup_invite(invite_code):
+    """ Returns (server id, server name) for an invite code, or None when it is invalid or expired. """
+    cached = invite_cache.get(invite_code)
+    if cached is not None:
+        return None if cached is INVALID_INVITE else cached
+
+    async with bot.web_session.get(f"{DISCORD_API}/invites/{invite_code}") as resp:
+        if resp.status == 200:
+            data = await resp.json()
+            result = (data['guild']['id'], data['guild']['name'])
+            invite_cache.set(invite_code, result)
+            return result
+        if resp.status == 404:
+            invite_cache.set(invite_code, INVALID_INVITE, ttl=INVALID_INVITE_TTL)
+        return None
+
+
 # ✅ /get-id <server-invite>
 @bot.tree.command(name="get-id", description="Get the server ID from an invite link (Staff only)")
 @app_commands.describe(invite="The invite link to the server")
@@ -475,69 +2209,176 @@ async def get_id(interaction: discord.Interaction, invite: str):
     invite_code = invite.replace("https://discord.gg/", "").replace("discord.gg/", "")
 
     # API request to get server-id
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"https://discord.com/api/v10/invites/{invite_code}?with_counts=true") as resp:
-            if resp.status == 200:
-                data = await resp.json()
-                server_name = data['guild']['name']
-                server_id = data['guild']['id']
-
-                embed = discord.Embed(
-                    title="🔍 Server ID Found",
-                    description=f"**Server Name:** {server_name}\n**Server ID:** `{server_id}`",
-                    color=discord.Color.green()
-                )
-                await interaction.response.send_message(embed=embed, ephemeral=True)
-            else:
-                await interaction.response.send_message("❌ Invalid or expired invite link.", ephemeral=True)
+    try:
+        found = await lookup_invite(invite_code)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return await interaction.response.send_message("❌ Could not reach Discord, please try again later.", ephemeral=True)
+
+    if found:
+        server_id, server_name = found
+        embed = discord.Embed(
+            title="🔍 Server ID Found",
+            description=f"**Server Name:** {server_name}\n**Server ID:** `{server_id}`",
+            color=discord.Color.green()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+    else:
+        await interaction.response.send_message("❌ Invalid or expired invite link.", ephemeral=True)
 
             
 import random
 
-@tasks.loop(minutes=90)  # Auto-bump every 1,5 hour
-async def auto_bump():
-    premium_data = load_yaml("premium-servers.yml") or {}  # load premium servers
-    auto_bump_data = load_yaml("auto-bump.yml") or {}  # Storage of bump thingys
-
-    premium_servers = list(premium_data.keys())  # Load all the permium servers
-
-    if not premium_servers:
-        print("❌ Geen premium servers gevonden voor auto-bump.")
-        return
+class AutoBumpLog:
+    """ Keeps auto-bump.yml in memory, it is only written when something changed (once per cycle or by flush_auto_bump_log). """
+
+    def __init__(self, file_path, shared_file_path=None):
+        self.file_path = file_path
+        self.shared_file_path = shared_file_path
+        self.data = None
+        self.dirty = False
+
+    def load(self):
+        if self.data is None:
+            data = load_yaml(self.file_path)
+            if not data and self.shared_file_path and self.shared_file_path != self.file_path:
+                # First start with our own file: take over our servers from the shared one
+                shared = load_yaml(self.shared_file_path) or {}
+                data = {guild_id: entry for guild_id, entry in shared.items() if is_local_guild(guild_id)}
+            self.data = data or {}
+        return self.data
+
+    def record(self, guild_id, delivery):
+        entry = self.load().setdefault(str(guild_id), {})
+        if delivery.delivered:
+            entry["last_bumped"] = datetime.now().isoformat()
+        entry["last_run"] = {
+            "attempted": delivery.attempted,
+            "delivered": delivery.delivered,
+            "skipped": delivery.skipped,
+            "failed": delivery.failed,
+            "duration": round(delivery.duration, 2),
+        }
+        self.dirty = True
+
+    async def flush(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        if not await file_writer.save_and_wait(self.file_path, copy.deepcopy(self.data)):
+            self.dirty = True  # Try again next time
+
+auto_bump_log = AutoBumpLog(AUTO_BUMP_FILE, SHARED_AUTO_BUMP_FILE)
+
+
+@tasks.loop(minutes=5)
+async def flush_auto_bump_log():
+    await auto_bump_log.flush()
+
+
+class AutoBumpSchedule:
+    """ Min-heap of (next due time, guild id), so every premium server is auto-bumped on its own moment
+    in the interval instead of all of them in one burst. """
+
+    def __init__(self, interval):
+        self.interval = interval.total_seconds()
+        self.heap = []
+        self.due_at = {}  # {guild id: due time}, heap entries with another time are outdated
+        self.running = set()
+
+    def schedule(self, guild_id, when):
+        self.due_at[guild_id] = when
+        heapq.heappush(self.heap, (when, guild_id))
+
+    def remove(self, guild_id):
+        self.due_at.pop(guild_id, None)  # The heap entry is skipped when it comes up
+
+    def first_due(self, guild_id, last_bumped, now):
+        """ Next interval after the last bump, or a fixed spot in the interval when that already passed. """
+        if last_bumped:
+            try:
+                when = datetime.fromisoformat(last_bumped).timestamp() + self.interval
+                if when > now:
+                    return when
+            except ValueError:
+                pass
+        return now + guild_id % int(self.interval)  # Spread new and overdue servers over the interval
+
+    def sync(self, guild_ids, auto_bump_data, now):
+        """ Adds new premium servers and drops the ones that are not premium anymore. """
+        for guild_id in list(self.due_at):
+            if guild_id not in guild_ids:
+                self.remove(guild_id)
+        for guild_id in guild_ids:
+            if guild_id not in self.due_at and guild_id not in self.running:
+                last_bumped = auto_bump_data.get(str(guild_id), {}).get("last_bumped")
+                self.schedule(guild_id, self.first_due(guild_id, last_bumped, now))
+
+    def pop_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            when, guild_id = heapq.heappop(self.heap)
+            if self.due_at.get(guild_id) == when:
+                del self.due_at[guild_id]
+                due.append((guild_id, when))
+        return due
+
+auto_bump_schedule = AutoBumpSchedule(AUTO_BUMP_INTERVAL)
+auto_bump_semaphore = asyncio.Semaphore(AUTO_BUMP_PARALLEL)
+auto_bump_tasks = set()
+
+
+async def auto_bump_guild(guild_id, due_time):
+    try:
+        async with auto_bump_semaphore:
+            guild = bot.get_guild(guild_id)
+            if not guild:
+                return  # Bot is not in the server anymore
 
-    for guild_id in premium_servers:
-        guild = bot.get_guild(int(guild_id))
-        if not guild:
-            continue  # Bot is not in the server anymore
+            ad = ad_cache.get(guild.id)
+            if not ad:
+                return  # Ad was removed or changed to an invalid one after the server was scheduled
 
-        ad_data = load_yaml(get_server_file(guild.id, "ad"))
-        ad_message = ad_data.get("message", "No advertisement set.")
+            # Chose other servers to bump in (never the own server)
+            target_channel_ids = bump_targets.sample(BUMP_LIMIT, exclude=guild.id)
 
-        # Chose other servers to bump in 
-        target_servers = random.sample(bot.guilds, min(100, len(bot.guilds)))
+            delivery = await deliver_ad(ad, target_channel_ids, source=guild.id, weight=BUMP_TIERS["premium"]["weight"], kind="auto")
+            auto_bump_log.record(guild.id, delivery)
+            log.info("✅ Auto-bumped %s: %s/%s sent, %s skipped, %s failed (%.1fs)",
+                     guild.name, delivery.delivered, delivery.attempted, delivery.skipped, delivery.failed, delivery.duration)
+    finally:
+        # Keep the cadence: next bump is one interval after this one was due
+        auto_bump_schedule.running.discard(guild_id)
+        auto_bump_schedule.schedule(guild_id, max(due_time + auto_bump_schedule.interval, time.time()))
 
-        for target_guild in target_servers:
-            if str(target_guild.id) == str(guild.id):
-                continue  # Don't bump in own server
 
-            bump_channel_id = load_yaml(get_server_file(target_guild.id, "bumps")).get("channel")
-            if not bump_channel_id:
-                continue
+@tasks.loop(minutes=1)  # Checks which premium servers are due, every server is auto-bumped every 1,5 hour
+async def auto_bump():
+    start_due_auto_bumps()  # Every auto-bump is timed on its own (fanout_duration, kind "auto")
 
-            bump_channel = target_guild.get_channel(int(bump_channel_id))
-            if not bump_channel or not bump_channel.permissions_for(target_guild.me).send_messages:
-                continue
 
-            try:
-                await bump_channel.send(ad_message)
-                print(f"✅ Auto-bumped in {target_guild.name}")
+def start_due_auto_bumps():
+    # Only premium servers that did not expire yet, are on our shards (other processes do the rest) and have a valid ad
+    premium_servers = {guild_id for guild_id in premium_registry.active_guilds() if is_local_guild(guild_id) and ad_cache.get(guild_id)}
+    auto_bump_schedule.sync(premium_servers, auto_bump_log.load(), time.time())
 
-                auto_bump_data[str(guild.id)] = {"last_bumped": datetime.now().isoformat()}
-                save_yaml("auto-bump.yml", auto_bump_data)  # save in auto-bump.yml
-            except Exception as e:
-                print(f"❌ Failed to bump in {target_guild.name}: {e}")
+    for guild_id, due_time in auto_bump_schedule.pop_due(time.time()):
+        auto_bump_schedule.running.add(guild_id)
+        task = asyncio.create_task(auto_bump_guild(guild_id, due_time))
+        auto_bump_tasks.add(task)
+        task.add_done_callback(auto_bump_tasks.discard)
                 
                 
+async def get_or_fetch_member(guild, member_id):
+    """ Member from the cache, or from the API when it is not cached. None when they left the server. """
+    member = guild.get_member(member_id)
+    if member is None:
+        try:
+            member = await guild.fetch_member(member_id)
+        except (discord.NotFound, discord.Forbidden):
+            return None
+    return member
+
+
 @bot.tree.command(name="managerlist", description="List all server managers.")
 async def managerlist(interaction: Interaction):
     guild = interaction.guild
@@ -549,12 +2390,15 @@ async def managerlist(interaction: Interaction):
     manager_roles_mentions = [role.mention for role in manager_roles] if manager_roles else ["None"]
 
     # Managers that are added by the Managers.
-    managers_file = f"servers/{guild.id}/special-managers.yml"
-    managers_data = load_yaml(managers_file) or {}
-    manager_ids = managers_data.get("managers", [])
-    
+    manager_ids = [int(mid) for mid in get_managers(guild.id)]
+
+    # Members are not always cached (low memory mode), get the missing ones from Discord
+    if any(guild.get_member(mid) is None for mid in manager_ids):
+        await interaction.response.defer()
+    members = await asyncio.gather(*(get_or_fetch_member(guild, mid) for mid in manager_ids))
+
     # change ID's to @mentions
-    manager_mentions = [guild.get_member(int(mid)).mention for mid in manager_ids if guild.get_member(int(mid))] if manager_ids else ["None"]
+    manager_mentions = [member.mention for member in members if member] or ["None"]
 
     # Embed
     embed = discord.Embed(title="📋 Server Managers", color=discord.Color.blue())
@@ -562,90 +2406,151 @@ async def managerlist(interaction: Interaction):
     embed.add_field(name="🔸 Assigned Managers", value="\n".join(manager_mentions), inline=False)
     embed.set_footer(text=f"Requested by {interaction.user}", icon_url=interaction.user.display_avatar.url)
 
-    await interaction.response.send_message(embed=embed)
+    if interaction.response.is_done():
+        await interaction.followup.send(embed=embed)
+    else:
+        await interaction.response.send_message(embed=embed)
 
-@bot.event
-async def on_message(message):
-    if message.guild is None and message.author != bot.user:  # Check if it is in a DM
-        if message.content.startswith("!suggest "):
-            suggestion = message.content[len("!suggest "):].strip()
-            if not suggestion:
-                return await message.channel.send("❌ Please provide a valid suggestion.")
-
-            # Embed in the Support server
-            channel = bot.get_channel(1345363894146826241)  # ID of suggestion channel
-            if channel:
-                embed = discord.Embed(title="New Suggestion", description=suggestion, color=discord.Color.blue())
-                embed.set_footer(text=f"Suggested by {message.author} ({message.author.id})")
-                await channel.send(embed=embed)
-
-            # send a embed to the user.
-            reply_embed = discord.Embed(
-                title="Suggestion Submitted!",
-                description="Thank you for your suggestion! Your suggestion has been posted in our Support server. It can be found here: https://discord.gg/Zb2pmrdgET",
-                color=discord.Color.green()
-            )
-            await message.channel.send(embed=reply_embed)
-
-    await bot.process_commands(message)  # Other CMD's keep working
-    
 @bot.tree.command(name="check-premium", description="Check if a server has premium status.")
 async def check_premium(interaction: discord.Interaction, server_id: Optional[str] = None):
     if server_id is None:
         server_id = str(interaction.guild.id)  # Use the server where the command is sended from if ID is none
 
-    premium_servers = load_yaml("premium-servers.yml") or {}
+    expiry_date = premium_registry.get_expiry(server_id) if server_id.isdigit() else None
 
-    if server_id in premium_servers and premium_servers[server_id].get("premium", False):
-        await interaction.response.send_message(f"✅ Server `{server_id}` has **Premium** status.", ephemeral=True)
+    if expiry_date:
+        await interaction.response.send_message(f"✅ Server `{server_id}` has **Premium** status until **{expiry_date} UTC**.", ephemeral=True)
     else:
         await interaction.response.send_message(f"❌ Server `{server_id}` does **not** have Premium status.", ephemeral=True)
 
 @bot.tree.command(name="info-commands", description="Get info commands you can DM me with!")
 async def info_commands(interaction: Interaction):
-    embed = discord.Embed(title="📩 Info Commands", description="You can DM me with the following commands:", color=discord.Color.blue())
-    embed.add_field(name="📨 `!suggest <suggestion>`", value="Send a suggestion to the developers!", inline=False)
-    embed.add_field(name="💰 `!paidpromo`", value="Get info about hosting a paid promo in our support server.", inline=False)
-    embed.add_field(name="❓ `!help`", value="This is the main help command.", inline=False)
-    embed.set_footer(text=f"Requested by {interaction.user}", icon_url=interaction.user.display_avatar.url)
-
+    embed = get_embed("info-commands", footer=f"Requested by {interaction.user}", icon_url=interaction.user.display_avatar.url)
     await interaction.response.send_message(embed=embed)
     
+SUGGESTION_CHANNEL_ID = 1345363894146826241  # ID of suggestion channel
+
+async def dm_suggest(message, suggestion):
+    suggestion = suggestion.strip()
+    if not suggestion:
+        return await message.channel.send("❌ Please provide a valid suggestion.")
+
+    # Embed in the Support server
+    channel = bot.get_channel(SUGGESTION_CHANNEL_ID)
+    if channel:
+        embed = discord.Embed(title="New Suggestion", description=suggestion, color=discord.Color.blue())
+        embed.set_footer(text=f"Suggested by {message.author} ({message.author.id})")
+        await channel.send(embed=embed)
+
+    # send a embed to the user.
+    reply_embed = discord.Embed(
+        title="Suggestion Submitted!",
+        description="Thank you for your suggestion! Your suggestion has been posted in our Support server. It can be found here: https://discord.gg/Zb2pmrdgET",
+        color=discord.Color.green()
+    )
+    await message.channel.send(embed=reply_embed)
+
+async def dm_paidpromo(message, args):
+    await message.channel.send(embed=get_embed("paidpromo"))
+
+async def dm_help(message, args):
+    embed = get_embed("help", footer="Need more help? Join our support server! /support.", icon_url=bot.user.display_avatar.url)
+    await message.channel.send(embed=embed)
+
+# DM command (first word of the message) -> handler(message, rest of the message)
+DM_COMMANDS = {
+    "!suggest": dm_suggest,
+    "!paidpromo": dm_paidpromo,
+    "!help": dm_help,
+}
+
 @bot.event
 async def on_message(message):
-    if message.author.bot:
+    # Only DMs have commands, server messages are ignored right away
+    if message.guild is not None or message.author.bot:
         return  # Fuk other bots
 
-    if isinstance(message.channel, discord.DMChannel):  # Check if it is in a DM
-        if message.content.lower() == "!paidpromo":
-            embed = discord.Embed(title="💰 Paid Promotion", description="Want to promote your server with a paid promo? Here’s how it works!", color=discord.Color.gold())
-            embed.add_field(name="📢 What is a paid promo?", value="A paid promo let you host a giveaway in the support server. The members first need to join your server before they can win. This makes your server growth go INSANE!", inline=False)
-            embed.add_field(name="💵 Pricing & Details", value="Join our support server and create a support ticket for more info: [Support Server](https://discord.gg/eDMGawH7HH)", inline=False)
-            await message.channel.send(embed=embed)
-            print("!paidpromo is used.")
-
-        elif message.content.lower() == "!help":
-            embed = discord.Embed(title="❓ Help Command", description="Here are some useful commands you can use:", color=discord.Color.blue())
-            embed.add_field(name="📩 `!suggest <suggestion>` *only works in DMs to me!*", value="Submit a suggestion to the developers.", inline=False)
-            embed.add_field(name="💰 `!paidpromo` *only works in DMs to me!*", value="Get info about hosting a paid promo.", inline=False)
-            embed.add_field(name="🔹 `/bump`", value="Manually bump your server.", inline=False)
-            embed.add_field(name="🔸 `/setup`", value="Set up the bot for your server.", inline=False)
-            embed.add_field(name="📈 `/leaderboard`", value="View the top 10 most active bump servers.")
-            embed.add_field(name="🛠️ `/addmanager`, `/removemanager`", value="Add managers to your server that can run '/setup'.") 
-            embed.set_footer(text="Need more help? Join our support server! /support.", icon_url=bot.user.display_avatar.url)
-            await message.channel.send(embed=embed)
-            print("!help us used.")
-
-    await bot.process_commands(message)  # Make sure all the other commands keep working
+    parts = message.content.split(maxsplit=1)
+    if not parts:
+        return
+    command = parts[0].lower()
+    handler = DM_COMMANDS.get(command)
+    if handler:
+        metrics.dm_commands.inc(command)
+        await handler(message, parts[1] if len(parts) > 1 else "")
+
+
+# Keep the bump target index up to date
+@bot.event
+async def on_guild_join(guild):
+    bump_targets.refresh(guild)
+
+@bot.event
+async def on_guild_remove(guild):
+    bump_targets.discard(guild.id)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    if bump_targets.channels.get(channel.guild.id) == channel.id:
+        bump_targets.discard(channel.guild.id)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    if before.overwrites != after.overwrites:
+        bump_targets.refresh(after.guild)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    if before.permissions != after.permissions:
+        bump_targets.refresh(after.guild)
+
+@bot.event
+async def on_guild_role_delete(role):
+    bump_targets.refresh(role.guild)
+
+@bot.event
+async def on_member_update(before, after):
+    if after.id == bot.user.id and before.roles != after.roles:  # The bot itself got other roles
+        bump_targets.refresh(after.guild)
 
 
 @bot.event
 async def on_ready():
-    await bot.tree.sync()
-    print(f"commands synced!")
+    loop_lag_monitor.start()
+    await run_io(guild_config.load_all)  # Load the server configs without blocking the bot
+    for watched in watched_files:
+        await run_io(watched.refresh)
+    await run_io(target_health.load)  # Before the rebuild, it checks every server for a quarantine
+    bump_targets.rebuild(bot.guilds)
+    await run_io(bump_leaderboard.load)
+    await run_io(bump_cooldowns.load)
+    await run_io(auto_bump_log.load)  # Read here, so the first auto-bump tick doesn't read it on the event loop
+    await run_io(recent_deliveries.load)
+    if bot.shard_ids is None or 0 in bot.shard_ids:  # Only one process has to sync the commands
+        await bot.tree.sync()
+        log.info("commands synced!")
     if not auto_bump.is_running():
         auto_bump.start()  # Start the auto-bump loop
-    print(f"Auto-bump started!")
-    print(f"Bot is logged in as XtremeBump.")
-
-bot.run(TOKEN)
+    if not flush_auto_bump_log.is_running():  # Writes the auto-bump stats
+        flush_auto_bump_log.start()
+    if not watch_files.is_running():
+        watch_files.start()
+    if not flush_bump_cooldowns.is_running():  # Writes the bump cooldowns
+        flush_bump_cooldowns.start()
+    if not check_target_health.is_running():  # Ends quarantines of bump channels
+        check_target_health.start()
+    if not save_recent_deliveries.is_running():
+        save_recent_deliveries.start()
+    if not compact_data.is_running():  # Removes expired premium servers and data of servers the bot left
+        compact_data.start()
+    if SHARD_IDS and not refresh_leaderboard.is_running():  # Bumps of the servers of the other processes
+        refresh_leaderboard.start()
+    log.info("Auto-bump started!")
+    log.info("Bot is logged in as XtremeBump.")
+    log.info("Running shard(s) %s of %s, %s servers.", bot.shard_ids if bot.shard_ids is not None else "all", bot.shard_count, len(bot.guilds))
+
+if __name__ == "__main__":
+    if "--migrate-sqlite" in sys.argv:
+        migrate_to_sqlite()  # python app.py --migrate-sqlite, then start with STORAGE_BACKEND=sqlite
+    else:
+        bot.run(TOKEN)
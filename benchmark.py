@@ -0,0 +1,487 @@
+# Offline benchmark for the bump pipeline: runs /setup (the save part), /bump, auto-bump and /leaderboard
+# against fake servers and a fake Discord API, so no token or real servers are needed.
+#
+#   python benchmark.py --guilds 5000 --bumps 200 --latency-ms 80 --rate-limit 0.02
+#   python benchmark.py --memory --guilds 5000     (memory of the discord.py cache, default vs LOW_MEMORY=1)
+#   python benchmark.py --compare-serial           (one bump: the old send-and-sleep loop vs the bump queue)
+#
+# Everything runs in a temporary folder (a synthetic servers/ tree), your own data is not touched.
+# Run it before and after a storage or delivery change and compare the numbers.
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+BOT_ID = 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the bump pipeline.")
+    parser.add_argument("--guilds", type=int, default=2000, help="Servers the fake bot is in")
+    parser.add_argument("--configured", type=float, default=0.7, help="Part of the servers that ran /setup")
+    parser.add_argument("--no-permission", type=float, default=0.1, help="Part of the configured servers where the bot can't talk in the bump channel")
+    parser.add_argument("--forbidden", type=float, default=0.02, help="Part of the sends that fail with 403 (permissions changed after startup)")
+    parser.add_argument("--setups", type=int, default=100, help="/setup saves to run")
+    parser.add_argument("--bumps", type=int, default=100, help="/bump commands to run")
+    parser.add_argument("--auto-bumps", type=int, default=30, help="Premium servers to auto-bump")
+    parser.add_argument("--leaderboards", type=int, default=500, help="/leaderboard commands to run")
+    parser.add_argument("--parallel", type=int, default=20, help="Commands running at the same time")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Average latency of a send to the fake API")
+    parser.add_argument("--rate-limit", type=float, default=0.01, help="Part of the sends that get a 429")
+    parser.add_argument("--max-rps", type=float, default=0, help="Sends per second before the fake API gives 429s (0 = no limit)")
+    parser.add_argument("--storage", choices=("yaml", "sqlite"), default="yaml")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary folder")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--memory", action="store_true", help="Compare the memory of the discord.py cache with and without LOW_MEMORY")
+    parser.add_argument("--channels-per-guild", type=int, default=15)
+    parser.add_argument("--roles-per-guild", type=int, default=10)
+    parser.add_argument("--members-per-guild", type=int, default=20, help="Members in the GUILD_CREATE payload (the member cache flags decide which are kept)")
+    parser.add_argument("--messages-per-guild", type=int, default=10, help="MESSAGE_CREATE events per server (only when the intents get them)")
+    parser.add_argument("--memory-child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--compare-serial", action="store_true", help="Time bumps with the old serial loop next to deliver_ad")
+    parser.add_argument("--fanout-bumps", type=int, default=3, help="Bumps per loop in --compare-serial")
+    parser.add_argument("--fanout-targets", type=int, default=100, help="Targets per bump in --compare-serial")
+    parser.add_argument("--serial-sleep", type=float, default=10.0, help="Sleep of the old loop after every 20 targets")
+    return parser.parse_args()
+
+
+class FileOpenCounter:
+    """ Counts opened files with an audit hook (these can't be removed, so it is only turned on and off). """
+
+    def __init__(self):
+        self.enabled = False
+        self.count = 0
+        sys.addaudithook(self._hook)
+
+    def _hook(self, event, args):
+        if self.enabled and event in ("open", "os.open"):
+            self.count += 1
+
+
+class FakeDiscord:
+    """ Fake REST API for channel.send: latency, random 429s, an optional requests per second limit and 403s. """
+
+    def __init__(self, discord, latency, rate_limit, max_rps, forbidden):
+        self.discord = discord
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.max_rps = max_rps
+        self.forbidden = forbidden
+        self.requests = 0
+        self.delivered = 0
+        self.rate_limited = 0
+        self.window_start = 0.0
+        self.window_requests = 0
+
+    def _error(self, status, reason, retry_after=None):
+        response = SimpleNamespace(status=status, reason=reason)
+        if status == 403:
+            return self.discord.Forbidden(response, "Missing Access")
+        error = self.discord.HTTPException(response, "You are being rate limited.")
+        error.retry_after = retry_after
+        return error
+
+    async def send(self, channel):
+        self.requests += 1
+        await asyncio.sleep(random.expovariate(1 / self.latency) if self.latency else 0)
+
+        now = time.monotonic()
+        if self.max_rps:
+            if now - self.window_start >= 1:
+                self.window_start, self.window_requests = now, 0
+            self.window_requests += 1
+            if self.window_requests > self.max_rps:
+                self.rate_limited += 1
+                raise self._error(429, "Too Many Requests", retry_after=1 - (now - self.window_start))
+        if random.random() < self.rate_limit:
+            self.rate_limited += 1
+            raise self._error(429, "Too Many Requests", retry_after=random.uniform(0.05, 0.5))
+        if random.random() < self.forbidden:
+            raise self._error(403, "Forbidden")
+        self.delivered += 1
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild, can_send, api):
+        self.id = channel_id
+        self.name = f"bumps-{channel_id}"
+        self.guild = guild
+        self.can_send = can_send
+        self.api = api
+
+    def permissions_for(self, member):
+        return SimpleNamespace(send_messages=self.can_send)
+
+    async def send(self, content=None, **kwargs):
+        await self.api.send(self)
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.name = f"Server {guild_id}"
+        self.me = SimpleNamespace(id=BOT_ID)
+        self.owner = SimpleNamespace(send=self._owner_dm)
+        self.channels = {}
+
+    async def _owner_dm(self, content=None, **kwargs):
+        pass
+
+    @property
+    def text_channels(self):
+        return list(self.channels.values())
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+
+class FakeInteraction:
+    """ Just enough of discord.Interaction for /bump and /leaderboard. """
+
+    def __init__(self, guild):
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = SimpleNamespace(id=BOT_ID + 1, guild_permissions=SimpleNamespace(manage_guild=True))
+        self.channel = next(iter(guild.channels.values()), None)
+        self.replies = []
+        self.response = SimpleNamespace(defer=self._defer, send_message=self._reply)
+        self.followup = SimpleNamespace(send=self._reply)
+
+    async def _defer(self, *args, **kwargs):
+        pass
+
+    async def _reply(self, content=None, **kwargs):
+        self.replies.append(content or kwargs.get("embed"))
+
+
+def percentile(values, part):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(part * len(values)))]
+
+
+def rss_mb():
+    """ Current memory use, from /proc when it is there. """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return 0.0
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class Benchmark:
+    def __init__(self, args, app, api, opens):
+        self.args = args
+        self.app = app
+        self.api = api
+        self.opens = opens
+        self.results = []
+
+    async def phase(self, name, amount, func, parallel=1):
+        """ Runs func(i) `amount` times with max `parallel` at the same time and keeps the numbers. """
+        latencies = []
+        semaphore = asyncio.Semaphore(parallel)
+        requests_before = self.api.requests
+
+        async def one(i):
+            async with semaphore:
+                started = time.perf_counter()
+                await func(i)
+                latencies.append(time.perf_counter() - started)
+
+        self.opens.count = 0
+        self.opens.enabled = True
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(amount)))
+        await self.app.file_writer.wait_all()
+        duration = time.perf_counter() - started
+        self.opens.enabled = False
+
+        self.results.append({
+            "phase": name,
+            "operations": amount,
+            "seconds": round(duration, 3),
+            "ops_per_second": round(amount / duration, 1) if duration else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "sends": self.api.requests - requests_before,
+            "file_opens": self.opens.count,
+            "rss_mb": round(rss_mb(), 1),
+        })
+
+    def print_results(self):
+        if self.args.json:
+            print(json.dumps({
+                "results": self.results,
+                "api": {"requests": self.api.requests, "delivered": self.api.delivered, "rate_limited": self.api.rate_limited},
+                "peak_rss_mb": round(peak_rss_mb(), 1),
+            }, indent=2))
+            return
+
+        columns = ("phase", "operations", "seconds", "ops_per_second", "p50_ms", "p99_ms", "sends", "file_opens", "rss_mb")
+        print(" ".join(f"{column:>14}" for column in columns))
+        for result in self.results:
+            print(" ".join(f"{str(result[column]):>14}" for column in columns))
+        print(f"\nFake API: {self.api.requests} requests, {self.api.delivered} delivered, {self.api.rate_limited} rate limited (429)")
+        print(f"Peak memory: {peak_rss_mb():.1f} MB")
+
+
+def build_population(args, api):
+    """ Fake servers: every server gets one text channel, `configured` of them ran /setup. """
+    guilds = {}
+    configured = []
+    for i in range(args.guilds):
+        guild = FakeGuild(guild_id=(1_000_000 + i) << 22)
+        can_send = random.random() >= args.no_permission
+        channel = FakeChannel(guild.id + 1, guild, can_send, api)
+        guild.channels[channel.id] = channel
+        guilds[guild.id] = guild
+        if random.random() < args.configured:
+            configured.append(guild)
+    return guilds, configured
+
+
+def write_server_files(app, configured):
+    """ The synthetic servers/ tree (or database rows), written the same way the bot saves them. """
+    for guild in configured:
+        channel_id = next(iter(guild.channels))
+        app.save_yaml(app.get_server_file(guild.id, "bumps"), {"channel": channel_id})
+        app.save_yaml(app.get_server_file(guild.id, "ad"), {"message": f"Join {guild.name}! https://discord.gg/bench{guild.id % 100000}"})
+        app.save_yaml(app.get_server_file(guild.id, "total-bumps"), {"count": random.randint(0, 5000)})
+    app.storage.flush()
+
+
+async def serial_bump(discord, get_channel, content, channel_ids, sleep_seconds):
+    """ The bump loop from before the bump queue: one send at a time and a sleep after every 20 targets. """
+    sent_count = 0
+    for i, target_channel_id in enumerate(channel_ids):
+        target_channel = get_channel(target_channel_id)
+        if target_channel:
+            try:
+                await target_channel.send(content)
+                sent_count += 1
+            except discord.Forbidden:
+                pass
+            except discord.HTTPException:
+                pass  # The fake 429s, the real discord.py waits and tries again itself
+
+        if (i + 1) % 20 == 0:
+            await asyncio.sleep(sleep_seconds)
+    return sent_count
+
+
+async def compare_serial(args, app, bench, bump_sources):
+    """ The same bumps (same targets) with the old loop and with deliver_ad, one phase each. """
+    import discord
+
+    bumps = []
+    for i in range(args.fanout_bumps):
+        source = bump_sources[i % len(bump_sources)]
+        bumps.append((source, app.bump_targets.sample(args.fanout_targets, exclude=source.id)))
+    ad = app.PreparedAd("Come and join us, we have events every week! https://discord.gg/compare")
+    parallel = max(1, min(args.parallel, args.fanout_bumps))
+
+    async def serial(i):
+        await serial_bump(discord, app.bot.get_channel, ad.content, bumps[i][1], args.serial_sleep)
+    await bench.phase("fanout-serial", len(bumps), serial, parallel)
+
+    async def engine(i):
+        await app.deliver_ad(ad, bumps[i][1], source=bumps[i][0].id)
+    await bench.phase("fanout-engine", len(bumps), engine, parallel)
+
+
+async def run(args, app, api, opens, guilds, configured):
+    bench = Benchmark(args, app, api, opens)
+    app.bot.get_channel = lambda channel_id: guilds.get(channel_id - 1) and guilds[channel_id - 1].get_channel(channel_id)
+    app.bot.get_guild = guilds.get
+
+    async def startup(i):
+        await app.run_io(app.guild_config.load_all)
+        app.bump_targets.rebuild(guilds.values())
+        await app.run_io(app.bump_leaderboard.load)
+    await bench.phase("startup", 1, startup)
+
+    async def setup_save(i):
+        guild = configured[i % len(configured)]
+        ad, error = app.prepare_ad(f"Come and join {guild.name}, we have events every week! https://discord.gg/new{i}")
+        app.guild_config.set(guild.id, "bumps", {"channel": next(iter(guild.channels))})
+        app.ad_cache.set(guild.id, ad)
+        app.bump_targets.refresh(guild)
+    await bench.phase("setup-save", args.setups, setup_save, args.parallel)
+
+    bump_sources = [guild for guild in configured if guild.id in app.bump_targets.channels]
+    random.shuffle(bump_sources)
+
+    if args.compare_serial:
+        await compare_serial(args, app, bench, bump_sources)
+        bench.print_results()
+        return
+
+    async def bump(i):
+        guild = bump_sources[i % len(bump_sources)]
+        app.bump_cooldowns.release(guild.id)  # Same server may bump more than once in the benchmark
+        await app.bump.callback(FakeInteraction(guild))
+    await bench.phase("bump", args.bumps, bump, args.parallel)
+
+    async def auto_bump(i):
+        guild = bump_sources[-(i % len(bump_sources)) - 1]
+        app.auto_bump_schedule.running.add(guild.id)
+        await app.auto_bump_guild(guild.id, time.time())
+    await bench.phase("auto-bump", args.auto_bumps, auto_bump, args.auto_bumps)
+
+    async def leaderboard(i):
+        guild = bump_sources[i % len(bump_sources)]
+        await app.leaderboard.callback(FakeInteraction(guild), None)
+    await bench.phase("leaderboard", args.leaderboards, leaderboard, args.parallel)
+
+    await app.auto_bump_log.flush()
+    await app.bump_cooldowns.flush()
+    await app.file_writer.wait_all()
+    await app.run_io(app.storage.flush)
+    bench.print_results()
+
+
+def fake_user(user_id):
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "avatar": None, "global_name": None}
+
+
+def fake_member(user_id):
+    return {"user": fake_user(user_id), "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0}
+
+
+def fake_guild_payload(args, guild_id):
+    """ GUILD_CREATE data like Discord sends it: channels, roles and the members (always the bot itself). """
+    return {
+        "id": str(guild_id),
+        "name": f"Server {guild_id}",
+        "owner_id": str(guild_id + 7),
+        "member_count": args.members_per_guild + 1,
+        "roles": [
+            {"id": str(guild_id + i), "name": "@everyone" if i == 0 else f"role {i}", "permissions": "0", "position": i,
+             "color": 0, "hoist": False, "managed": False, "mentionable": False}
+            for i in range(args.roles_per_guild)
+        ],
+        "channels": [
+            {"id": str(guild_id + 1000 + i), "type": 0, "name": f"channel-{i}", "position": i, "permission_overwrites": []}
+            for i in range(args.channels_per_guild)
+        ],
+        "members": [fake_member(BOT_ID)] + [fake_member(guild_id + 100 + i) for i in range(args.members_per_guild)],
+    }
+
+
+def fake_message_payload(guild_id, message_id, author_id, channel_id):
+    member = fake_member(author_id)
+    return {
+        "id": str(message_id), "channel_id": str(channel_id), "guild_id": str(guild_id), "type": 0,
+        "author": member.pop("user"), "member": member, "content": "hello there", "timestamp": "2024-01-01T00:00:00+00:00",
+        "edited_timestamp": None, "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [],
+        "attachments": [], "embeds": [], "pinned": False,
+    }
+
+
+def memory_child(args):
+    """ Fills the discord.py cache of the bot from app.py with fake servers and prints its memory use as JSON. """
+    import discord
+    import app
+
+    state = app.bot._connection
+    state.dispatch = lambda *args, **kwargs: None  # No event handlers, only the cache
+    state.user = discord.ClientUser(state=state, data={**fake_user(BOT_ID), "bot": True, "mfa_enabled": False, "flags": 0, "verified": True})
+    gc.collect()
+    before = rss_mb()
+
+    message_id = 1
+    for i in range(args.guilds):
+        guild_id = (1_000_000 + i) << 22
+        state._add_guild_from_data(fake_guild_payload(args, guild_id))
+        if state._intents.guild_messages:  # Discord only sends these when the bot asked for them
+            for j in range(args.messages_per_guild):
+                state.parse_message_create(fake_message_payload(guild_id, message_id, guild_id + 100 + j % max(args.members_per_guild, 1), guild_id + 1000))
+                message_id += 1
+    gc.collect()
+    after = rss_mb()
+
+    print(json.dumps({
+        "mode": "low memory" if app.LOW_MEMORY else "default",
+        "guilds": args.guilds,
+        "rss_before_mb": round(before, 1),
+        "rss_after_mb": round(after, 1),
+        "mb_per_1000_guilds": round((after - before) / args.guilds * 1000, 2) if args.guilds else 0.0,
+        "cached_members": sum(len(guild.members) for guild in state._guilds.values()),
+        "cached_messages": len(state._messages) if state._messages is not None else 0,
+    }))
+
+
+def run_memory_comparison(args):
+    """ Runs memory_child once without and once with LOW_MEMORY, each in its own process. """
+    results = []
+    for low_memory in ("0", "1"):
+        command = [sys.executable, os.path.abspath(__file__), "--memory-child", "--guilds", str(args.guilds),
+                   "--channels-per-guild", str(args.channels_per_guild), "--roles-per-guild", str(args.roles_per_guild),
+                   "--members-per-guild", str(args.members_per_guild), "--messages-per-guild", str(args.messages_per_guild)]
+        output = subprocess.run(command, env={**os.environ, "LOW_MEMORY": low_memory}, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = ("mode", "guilds", "rss_before_mb", "rss_after_mb", "mb_per_1000_guilds", "cached_members", "cached_messages")
+    print(" ".join(f"{column:>18}" for column in columns))
+    for result in results:
+        print(" ".join(f"{str(result[column]):>18}" for column in columns))
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bumpbot-bench-")
+    root = os.path.dirname(os.path.abspath(__file__))
+
+    # app.py reads its settings and creates its files on import, so set everything up first
+    os.environ.update({"DISCORD_TOKEN": "benchmark", "STORAGE_BACKEND": args.storage, "LOG_LEVEL": "ERROR"})
+    os.environ.pop("BUMP_WORKERS", None)
+    os.environ.pop("METRICS_PORT", None)
+    os.chdir(workdir)
+    sys.path.insert(0, root)
+    try:
+        if args.memory:
+            return run_memory_comparison(args)
+        if args.memory_child:
+            return memory_child(args)
+
+        import discord
+        import app
+
+        opens = FileOpenCounter()
+        api = FakeDiscord(discord, args.latency_ms / 1000, args.rate_limit, args.max_rps, args.forbidden)
+        guilds, configured = build_population(args, api)
+        if not configured:
+            sys.exit("❌ No configured servers, use a higher --guilds or --configured.")
+        write_server_files(app, configured)
+        print(f"🧪 {len(guilds)} servers, {len(configured)} configured, {args.storage} storage, in {workdir}",
+              file=sys.stderr if args.json else sys.stdout)
+        asyncio.run(run(args, app, api, opens, guilds, configured))
+    finally:
+        os.chdir(root)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# Local work queue between the bot and the bump workers (bump_worker.py), stored in SQLite.
+# The bot puts a bump in here (one row per target channel), the workers send them and write back the result.
+import os
+import sqlite3
+import threading
+import time
+
+import discord
+
+QUEUE_DB = os.getenv("BUMP_QUEUE_DB", "bump-queue.db")
+
+# Shared by the bot and the workers, so both send a bump the same way
+BUMP_SEND_ATTEMPTS = 3  # Tries per target when we get rate limited
+AD_ALLOWED_MENTIONS = discord.AllowedMentions.none()  # Ads never ping @everyone, roles or users in other servers
+
+# Job status
+QUEUED = "queued"
+SENDING = "sending"
+DELIVERED = "delivered"
+FAILED = "failed"
+FORBIDDEN = "forbidden"  # Missing permissions or the channel is gone, the bot checks the server again
+DONE = (DELIVERED, FAILED, FORBIDDEN)
+
+
+class BumpQueue:
+    """ The jobs table, used by the bot (enqueue/results) and by the workers (claim/finish). """
+
+    def __init__(self, db_path=QUEUE_DB):
+        self.lock = threading.Lock()  # The bot uses the queue from more than one thread
+        self.connection = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                batch TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                turn INTEGER NOT NULL DEFAULT 0,
+                source_guild INTEGER NOT NULL,
+                channel_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                not_before REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS jobs_by_batch ON jobs (batch, status);
+        """)
+        columns = [column[1] for column in self.connection.execute("PRAGMA table_info(jobs)")]
+        for column, definition in (("attempts", "INTEGER NOT NULL DEFAULT 0"), ("not_before", "REAL NOT NULL DEFAULT 0"), ("turn", "INTEGER NOT NULL DEFAULT 0")):
+            if column not in columns:
+                self.connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")  # Queues of older versions
+                if column == "turn":
+                    self.connection.execute("UPDATE jobs SET turn = position")
+        self.connection.execute("DROP INDEX IF EXISTS jobs_to_claim")  # Was on (status, position, id)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS jobs_to_claim_by_turn ON jobs (status, turn, id)")
+
+    def enqueue(self, batch, source_guild, content, channel_ids, weight=1):
+        """ `weight` is the messages per turn of the bump, like in the bot's own queue (premium servers get more). """
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany(
+                "INSERT INTO jobs (batch, position, turn, source_guild, channel_id, content, status, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(batch, position, position // weight, source_guild, channel_id, content, QUEUED, now) for position, channel_id in enumerate(channel_ids)]
+            )
+
+    def claim(self, worker, limit):
+        """ Takes up to `limit` jobs for a worker. Jobs are ordered on their turn in the bump, so bumps that
+        are queued at the same time take turns instead of one bump going first (`weight` jobs per turn). """
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")  # Only one worker can claim at a time
+            rows = self.connection.execute(
+                "SELECT id, source_guild, channel_id, content FROM jobs WHERE status = ? AND not_before <= ? ORDER BY turn, id LIMIT ?",
+                (QUEUED, time.time(), limit)
+            ).fetchall()
+            if rows:
+                self.connection.executemany(
+                    "UPDATE jobs SET status = ?, worker = ?, updated_at = ? WHERE id = ?",
+                    [(SENDING, worker, time.time(), row[0]) for row in rows]
+                )
+        return rows
+
+    def finish(self, job_id, status, error=None):
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?", (status, error, time.time(), job_id))
+
+    def retry(self, job_id, delay, max_attempts, error=None):
+        """ Puts a rate limited job back in the queue, it can be claimed again after `delay` seconds.
+        After `max_attempts` tries it is failed. Returns the new status. """
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            attempts = self.connection.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            attempts = (attempts[0] if attempts else 0) + 1
+            status = FAILED if attempts >= max_attempts else QUEUED
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, error = ?, attempts = ?, not_before = ?, updated_at = ? WHERE id = ?",
+                (status, error, attempts, now + delay, now, job_id)
+            )
+        return status
+
+    def requeue_stale(self, older_than):
+        """ Gives jobs back to the queue when their worker did not finish them in `older_than` seconds (crashed). """
+        with self.lock, self.connection:
+            return self.connection.execute(
+                "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND updated_at < ?",
+                (QUEUED, SENDING, time.time() - older_than)
+            ).rowcount
+
+    def results(self, batch):
+        """ {status: amount} for a bump. """
+        with self.lock:
+            rows = self.connection.execute("SELECT status, COUNT(*) FROM jobs WHERE batch = ? GROUP BY status", (batch,))
+            return dict(rows.fetchall())
+
+    def channels(self, batch, status):
+        """ Channels of a bump with the given status. """
+        with self.lock:
+            rows = self.connection.execute("SELECT channel_id FROM jobs WHERE batch = ? AND status = ?", (batch, status))
+            return [row[0] for row in rows]
+
+    def forget(self, batch):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM jobs WHERE batch = ?", (batch,))
@@ -0,0 +1,94 @@
+# Bump worker: sends the bump messages that the bot puts in the local queue (see bump_queue.py).
+# Start the bot with BUMP_WORKERS=1 and run one or more workers next to it with: python bump_worker.py
+import asyncio
+import os
+import socket
+
+import discord
+from discord.http import HTTPClient, Route, handle_message_parameters
+from dotenv import load_dotenv
+
+import metrics
+from bump_queue import AD_ALLOWED_MENTIONS, BUMP_SEND_ATTEMPTS, BumpQueue, DELIVERED, FAILED, FORBIDDEN
+
+load_dotenv()
+log = metrics.setup_logging("bumpworker", os.getenv("LOG_LEVEL", "INFO"))
+
+TOKEN = os.getenv("DISCORD_TOKEN")
+WORKER_NAME = f"{socket.gethostname()}-{os.getpid()}"
+WORKER_CONCURRENCY = int(os.getenv("BUMP_WORKER_CONCURRENCY", "10"))  # Max messages this worker sends at the same time
+POLL_INTERVAL = 0.5  # Seconds between looking for new jobs when the queue is empty
+STALE_AFTER = 120  # Seconds before jobs of a crashed worker are given to another worker
+MAX_RATELIMIT_WAIT = 30.0
+
+if os.getenv("DISCORD_API"):
+    Route.BASE = os.getenv("DISCORD_API")  # For testing against a fake Discord API
+
+
+async def send_job(http, queue, job):
+    job_id, source_guild, channel_id, content = job
+    error = None
+    retry_after = None
+    try:
+        with handle_message_parameters(content=content, allowed_mentions=AD_ALLOWED_MENTIONS) as params:
+            await http.send_message(channel_id, params=params)
+        status = DELIVERED
+    except discord.RateLimited as e:
+        # Longer rate limit than we want to wait for here, put it back so it is tried again later
+        retry_after, error = e.retry_after, str(e)
+    except (discord.Forbidden, discord.NotFound) as e:
+        status, error = FORBIDDEN, str(e)
+    except discord.HTTPException as e:
+        if e.status == 429:
+            retry_after, error = getattr(e, "retry_after", None) or 1.0, str(e)  # Plain 429 (no rate limit info)
+        else:
+            status, error = FAILED, str(e)
+    except Exception as e:
+        status, error = FAILED, str(e)
+
+    if retry_after is not None:
+        # Back in the queue right away (not SENDING while we wait, or requeue_stale hands it to another worker)
+        status = await asyncio.to_thread(queue.retry, job_id, retry_after, BUMP_SEND_ATTEMPTS, error)
+    else:
+        await asyncio.to_thread(queue.finish, job_id, status, error)
+    return status
+
+
+async def main():
+    queue = BumpQueue()
+    http = HTTPClient(asyncio.get_running_loop(), max_ratelimit_timeout=MAX_RATELIMIT_WAIT)
+    await http.static_login(TOKEN)
+    log.info("✅ Bump worker %s started.", WORKER_NAME)
+
+    running = set()
+    last_stale_check = 0.0
+    try:
+        while True:
+            now = asyncio.get_running_loop().time()
+            if now - last_stale_check > STALE_AFTER / 2:
+                last_stale_check = now
+                requeued = await asyncio.to_thread(queue.requeue_stale, STALE_AFTER)
+                if requeued:
+                    log.warning("⚠️ Gave %s jobs of a stopped worker back to the queue.", requeued)
+
+            free = WORKER_CONCURRENCY - len(running)
+            jobs = await asyncio.to_thread(queue.claim, WORKER_NAME, free) if free > 0 else []
+            for job in jobs:
+                task = asyncio.create_task(send_job(http, queue, job))
+                running.add(task)
+                task.add_done_callback(running.discard)
+
+            if running and not jobs:
+                await asyncio.wait(running, timeout=POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+            elif not jobs:
+                await asyncio.sleep(POLL_INTERVAL)
+            else:
+                await asyncio.sleep(0)
+    finally:
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        await http.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
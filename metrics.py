@@ -0,0 +1,164 @@
+# Metrics and logging for the bot: counters and histograms in the Prometheus text format on a local
+# /metrics page, and a logger that doesn't flood the console when the same thing goes wrong many times.
+import bisect
+import logging
+import threading
+import time
+
+from aiohttp import web
+
+# Buckets (seconds) for the histograms
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FANOUT_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {}  # {label values: count}
+        self.lock = threading.Lock()  # Also used from the I/O threads
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values = {}  # {label values: [count per bucket (+ one for +Inf), sum]}
+        self.lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        with self.lock:
+            counts = self.values.get(label_values)
+            if counts is None:
+                counts = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            counts[1] += seconds
+
+    def time(self, *label_values):
+        """ with histogram.time(): ... observes how long the block took. """
+        return _Timer(self, label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    labels = _label_text(self.labels + ("le",), label_values + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _label_text(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+
+
+send_latency = Histogram("bumpbot_send_seconds", "Time to send one bump message.")
+send_results = Counter("bumpbot_sends_total", "Bump messages by result.", labels=("result",))
+fanout_duration = Histogram("bumpbot_fanout_seconds", "Time to send a bump to all its targets.", labels=("kind",), buckets=FANOUT_BUCKETS)
+storage_duration = Histogram("bumpbot_storage_seconds", "Time of a call to the storage backend (load, save, load_guilds, ...).", labels=("operation",))
+loop_lag = Histogram("bumpbot_event_loop_lag_seconds", "How late the event loop woke up from a sleep.")
+dm_commands = Counter("bumpbot_dm_commands_total", "DM commands (!help, !suggest, ...) that were used.", labels=("command",))
+
+ALL_METRICS = [send_latency, send_results, fanout_duration, storage_duration, loop_lag, dm_commands]
+
+
+def render_metrics():
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server(host, port):
+    """ Serves /metrics on host:port, returns the runner to stop it with `await runner.cleanup()`. """
+    async def metrics_page(request):
+        return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_page)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+class RateLimitFilter(logging.Filter):
+    """ Lets max `burst` messages with the same text (before formatting) and the same first argument (the
+    file, server, ...) through per `interval` seconds, the next one that gets through says how many were dropped. """
+
+    def __init__(self, burst=5, interval=60.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.windows = {}  # {(logger, level, message, first argument): [window start, messages in window, dropped]}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        first_arg = record.args[0] if isinstance(record.args, tuple) and record.args else None
+        key = (record.name, record.levelno, record.msg, str(first_arg))
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                dropped = window[2] if window else 0
+                window = self.windows[key] = [now, 0, 0]
+                if dropped:
+                    record.msg = f"{record.msg} ({dropped} more like this were not logged)"
+                if len(self.windows) > 1000:
+                    # Forget old messages
+                    self.windows = {k: w for k, w in self.windows.items() if now - w[0] < self.interval}
+                    self.windows[key] = window
+            window[1] += 1
+            if window[1] > self.burst:
+                window[2] += 1
+                return False
+        return True
+
+
+def setup_logging(name, level="INFO"):
+    """ Logger that writes `time level name: message` lines to the console. """
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s", "%Y-%m-%d %H:%M:%S"))
+        handler.addFilter(RateLimitFilter())
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level.upper())
+    return logger
@@ -0,0 +1,12 @@
+# app.py reads its settings and creates its data files on import, so the tests run it in a temporary folder
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.update({"DISCORD_TOKEN": "test", "STORAGE_BACKEND": "yaml", "LOG_LEVEL": "ERROR"})
+for name in ("BUMP_WORKERS", "METRICS_PORT", "SHARD_IDS", "SHARD_COUNT", "LOW_MEMORY"):
+    os.environ.pop(name, None)
+os.chdir(tempfile.mkdtemp(prefix="bumpbot-test-"))
@@ -0,0 +1,140 @@
+# The in-process bump queue (BumpScheduler) with fake channels that answer like Discord does
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+import app
+
+
+def http_error(error_class, status, reason):
+    return error_class(SimpleNamespace(status=status, reason=reason), reason)
+
+
+class FakeChannel:
+    """ channel.send that gives the errors in `errors` first (one per send) and then delivers. """
+
+    def __init__(self, guild_id, errors=(), sent=None, gate=None):
+        self.id = guild_id + 1
+        self.guild = SimpleNamespace(id=guild_id, name=f"Server {guild_id}")
+        self.errors = list(errors)
+        self.sends = 0
+        self.sent = sent if sent is not None else []  # Shared between channels to see the send order
+        self.gate = gate  # Sends wait for this event when it is given
+
+    async def send(self, content=None, **kwargs):
+        self.sends += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(self.guild.id)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(app, "target_health", app.TargetHealth("target-health-test.yml"))
+    monkeypatch.setattr(app, "recent_deliveries", app.RecentDeliveries("recent-deliveries-test.yml"))
+
+
+async def send_all(scheduler, channels, source=1, weight=1):
+    ad = app.PreparedAd("Join our server!")
+    result = app.DeliveryResult()
+    jobs = [app.BumpJob(source, channel, ad, result) for channel in channels]
+    for job in jobs:
+        await scheduler.submit(job, weight)
+    delivered = await asyncio.gather(*(job.done for job in jobs))
+    return result, delivered
+
+
+def test_delivers_and_retries_rate_limits():
+    async def test():
+        scheduler = app.BumpScheduler(max_in_flight=2, max_queued=10)
+        channels = [
+            FakeChannel(100),
+            FakeChannel(200, errors=[discord.RateLimited(0.01)]),
+            FakeChannel(300, errors=[http_error(discord.HTTPException, 429, "Too Many Requests")]),
+        ]
+        result, delivered = await send_all(scheduler, channels)
+        assert delivered == [True, True, True]
+        assert (result.delivered, result.rate_limited, result.failed) == (3, 2, 0)
+        assert [channel.sends for channel in channels] == [1, 2, 2]
+
+    asyncio.run(test())
+
+
+def test_rate_limited_job_fails_after_max_attempts():
+    async def test():
+        scheduler = app.BumpScheduler(max_in_flight=1, max_queued=10)
+        channel = FakeChannel(100, errors=[discord.RateLimited(0.01) for _ in range(app.BUMP_SEND_ATTEMPTS + 1)])
+        result, delivered = await send_all(scheduler, [channel])
+        assert delivered == [False]
+        assert channel.sends == app.BUMP_SEND_ATTEMPTS
+        assert (result.delivered, result.rate_limited, result.failed) == (0, app.BUMP_SEND_ATTEMPTS, 1)
+
+    asyncio.run(test())
+
+
+def test_forbidden_and_missing_channels_are_quarantined():
+    async def test():
+        scheduler = app.BumpScheduler(max_in_flight=2, max_queued=10)
+        channels = [
+            FakeChannel(100, errors=[http_error(discord.Forbidden, 403, "Forbidden")]),
+            FakeChannel(200, errors=[http_error(discord.NotFound, 404, "Not Found")]),
+        ]
+        result, delivered = await send_all(scheduler, channels)
+        assert delivered == [False, False]
+        assert [channel.sends for channel in channels] == [1, 1]  # Not retried
+        assert result.failed == 2
+        assert app.target_health.is_quarantined(100) and app.target_health.is_quarantined(200)
+
+    asyncio.run(test())
+
+
+def test_full_queue_waits_and_cancelled_bump_gives_room_back():
+    async def test():
+        scheduler = app.BumpScheduler(max_in_flight=2, max_queued=5)
+        gate = asyncio.Event()
+        ad = app.PreparedAd("Join our server!")
+        result = app.DeliveryResult()
+        jobs = [app.BumpJob(1, FakeChannel(100 + i, gate=gate), ad, result) for i in range(6)]
+        for job in jobs[:5]:
+            await scheduler.submit(job)
+
+        # Backpressure: the sixth job waits until a job leaves the queue
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(asyncio.shield(scheduler.submit(jobs[5])), timeout=0.05)
+
+        # The bump is cancelled (like /bump being cancelled): all room comes back and the workers keep going
+        for job in jobs:
+            job.done.cancel()
+        gate.set()
+        await asyncio.sleep(0.05)
+        assert scheduler._room._value == 5
+        assert all(not worker.done() for worker in scheduler._workers)
+
+        result, delivered = await send_all(scheduler, [FakeChannel(900)])
+        assert delivered == [True]
+
+    asyncio.run(test())
+
+
+def test_sources_take_turns_by_weight():
+    async def test():
+        scheduler = app.BumpScheduler(max_in_flight=1, max_queued=100)
+        sent = []
+        ad = app.PreparedAd("Join our server!")
+        jobs = []
+        # All jobs are queued before the worker runs, so only the turn order decides
+        for source, weight in ((1, 1), (2, 2)):
+            result = app.DeliveryResult()
+            for i in range(6):
+                job = app.BumpJob(source, FakeChannel(source, sent=sent), ad, result)
+                await scheduler.submit(job, weight)
+                jobs.append(job.done)
+        await asyncio.gather(*jobs)
+        assert "".join(map(str, sent)) == "122122122111"
+
+    asyncio.run(test())
+
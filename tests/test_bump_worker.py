@@ -0,0 +1,112 @@
+# bump_worker.py against a local stub of the Discord REST API and a real queue database
+import asyncio
+
+from aiohttp import web
+from discord.http import HTTPClient, Route
+
+import bump_worker
+from bump_queue import BUMP_SEND_ATTEMPTS, BumpQueue, DELIVERED, FAILED, FORBIDDEN, QUEUED
+
+SENT, NO_ACCESS, RATE_LIMITED = 111, 222, 333  # Channel IDs with their answer from the stub
+
+
+class DiscordStub:
+    """ POST /channels/<id>/messages: sent, 403 or a long rate limit, depending on the channel. Counts the requests. """
+
+    def __init__(self):
+        self.requests = []
+
+    async def me(self, request):
+        return web.json_response({"id": "1", "username": "bot", "discriminator": "0", "avatar": None, "global_name": None})
+
+    async def send(self, request):
+        channel_id = int(request.match_info["channel_id"])
+        self.requests.append(channel_id)
+        if channel_id == NO_ACCESS:
+            return web.json_response({"message": "Missing Access", "code": 50001}, status=403)
+        if channel_id == RATE_LIMITED:
+            # Longer than MAX_RATELIMIT_WAIT, so discord.py raises RateLimited instead of waiting
+            return web.json_response({"message": "You are being rate limited.", "retry_after": 60.0, "global": False},
+                                     status=429, headers={"Via": "1.1 google", "Retry-After": "60"})
+        return web.json_response({
+            "id": "5", "channel_id": str(channel_id), "type": 0, "content": "ad", "tts": False, "pinned": False,
+            "author": {"id": "1", "username": "bot", "discriminator": "0", "avatar": None},
+            "attachments": [], "embeds": [], "mentions": [], "mention_roles": [], "mention_everyone": False,
+            "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "flags": 0, "components": [],
+        })
+
+
+async def with_stub(monkeypatch, tmp_path, test):
+    stub = DiscordStub()
+    web_app = web.Application()
+    web_app.router.add_get("/api/v10/users/@me", stub.me)
+    web_app.router.add_post("/api/v10/channels/{channel_id}/messages", stub.send)
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    monkeypatch.setattr(Route, "BASE", f"http://127.0.0.1:{port}/api/v10")
+
+    http = HTTPClient(asyncio.get_running_loop(), max_ratelimit_timeout=bump_worker.MAX_RATELIMIT_WAIT)
+    await http.static_login("test")
+    try:
+        await test(stub, http, BumpQueue(str(tmp_path / "queue.db")))
+    finally:
+        await http.close()
+        await runner.cleanup()
+
+
+def claim_all(queue):
+    return {job[2]: job for job in queue.claim("test-worker", 10)}
+
+
+def test_results_are_written_back(monkeypatch, tmp_path):
+    async def test(stub, http, queue):
+        queue.enqueue("bump", 1, "ad", [SENT, NO_ACCESS])
+        jobs = claim_all(queue)
+        assert await bump_worker.send_job(http, queue, jobs[SENT]) == DELIVERED
+        assert await bump_worker.send_job(http, queue, jobs[NO_ACCESS]) == FORBIDDEN
+        assert queue.results("bump") == {DELIVERED: 1, FORBIDDEN: 1}
+
+    asyncio.run(with_stub(monkeypatch, tmp_path, test))
+
+
+def test_rate_limited_job_is_requeued_without_waiting(monkeypatch, tmp_path):
+    async def test(stub, http, queue):
+        queue.enqueue("bump", 1, "ad", [RATE_LIMITED])
+        job = claim_all(queue)[RATE_LIMITED]
+        started = asyncio.get_running_loop().time()
+        assert await bump_worker.send_job(http, queue, job) == QUEUED
+        assert asyncio.get_running_loop().time() - started < 5  # Not sleeping out the rate limit while SENDING
+        assert queue.results("bump") == {QUEUED: 1}
+
+        # Not claimable before the rate limit is over, and a crashed worker check doesn't send it twice
+        assert queue.requeue_stale(0) == 0
+        assert claim_all(queue) == {}
+        assert stub.requests == [RATE_LIMITED]
+
+    asyncio.run(with_stub(monkeypatch, tmp_path, test))
+
+
+def test_rate_limited_job_fails_after_max_attempts(monkeypatch, tmp_path):
+    async def test(stub, http, queue):
+        queue.enqueue("bump", 1, "ad", [RATE_LIMITED])
+        for attempt in range(1, BUMP_SEND_ATTEMPTS + 1):
+            queue.connection.execute("UPDATE jobs SET not_before = 0")  # Skip the wait
+            job = claim_all(queue)[RATE_LIMITED]
+            status = await bump_worker.send_job(http, queue, job)
+            assert status == (FAILED if attempt == BUMP_SEND_ATTEMPTS else QUEUED)
+        assert queue.results("bump") == {FAILED: 1}
+        queue.connection.execute("UPDATE jobs SET not_before = 0")
+        assert claim_all(queue) == {}
+
+    asyncio.run(with_stub(monkeypatch, tmp_path, test))
+
+
+def test_claims_take_turns_by_weight(tmp_path):
+    queue = BumpQueue(str(tmp_path / "queue.db"))
+    queue.enqueue("free", 1, "ad", list(range(100, 106)))
+    queue.enqueue("premium", 2, "ad", list(range(200, 206)), weight=2)
+    order = [job[1] for job in queue.claim("test-worker", 12)]
+    assert "".join(map(str, order)) == "122122122111"
@@ -0,0 +1,31 @@
+# FileWriter: the files that are flushed now and then are written again after a failed write
+import asyncio
+
+import app
+
+
+def test_failed_flush_is_tried_again(monkeypatch):
+    save_yaml = app.save_yaml
+    saved = []
+
+    def fail_once(file_path, data):
+        if not saved:
+            saved.append(None)
+            raise OSError("disk full")
+        saved.append(data)
+        save_yaml(file_path, data)
+    monkeypatch.setattr(app, "save_yaml", fail_once)
+
+    async def test():
+        cooldowns = app.CooldownManager("bump-cooldowns-test.yml")
+        cooldowns.loaded = True
+        cooldowns.until[1] = 4102444800.0
+        cooldowns.dirty = True
+
+        await cooldowns.flush()
+        assert cooldowns.dirty  # Not written, still has to be saved
+        await cooldowns.flush()
+        assert not cooldowns.dirty
+        assert saved[-1] == {"1": 4102444800.0}
+
+    asyncio.run(test())
@@ -0,0 +1,99 @@
+# /get-id invite lookups against a local stub of the Discord invites endpoint
+import asyncio
+
+import aiohttp
+from aiohttp import web
+
+import app
+
+
+class InviteStub:
+    """ GET /invites/<code>: 200 for codes in `guilds`, 404 for the rest. Counts the requests. """
+
+    def __init__(self, guilds):
+        self.guilds = guilds
+        self.requests = []
+
+    async def invite(self, request):
+        code = request.match_info["code"]
+        self.requests.append(code)
+        if code not in self.guilds:
+            return web.json_response({"message": "Unknown Invite", "code": 10006}, status=404)
+        guild_id, name = self.guilds[code]
+        return web.json_response({"code": code, "guild": {"id": guild_id, "name": name}})
+
+
+async def with_stub(guilds, test):
+    stub = InviteStub(guilds)
+    web_app = web.Application()
+    web_app.router.add_get("/api/v10/invites/{code}", stub.invite)
+    runner = web.AppRunner(web_app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    old_api, old_session = app.DISCORD_API, app.bot.web_session
+    app.DISCORD_API = f"http://127.0.0.1:{port}/api/v10"
+    app.bot.web_session = aiohttp.ClientSession()
+    try:
+        await test(stub)
+    finally:
+        await app.bot.web_session.close()
+        app.DISCORD_API, app.bot.web_session = old_api, old_session
+        await runner.cleanup()
+
+
+def test_valid_invite_is_cached(monkeypatch):
+    monkeypatch.setattr(app, "invite_cache", app.TTLCache(maxsize=10, ttl=600))
+
+    async def test(stub):
+        assert await app.lookup_invite("abc") == ("123", "Test Server")
+        assert await app.lookup_invite("abc") == ("123", "Test Server")
+        assert stub.requests == ["abc"]
+
+    asyncio.run(with_stub({"abc": ("123", "Test Server")}, test))
+
+
+def test_unknown_invite_is_negatively_cached(monkeypatch):
+    monkeypatch.setattr(app, "invite_cache", app.TTLCache(maxsize=10, ttl=600))
+    monkeypatch.setattr(app, "INVALID_INVITE_TTL", 0.2)
+
+    async def test(stub):
+        assert await app.lookup_invite("gone") is None
+        assert await app.lookup_invite("gone") is None
+        assert stub.requests == ["gone"]
+        await asyncio.sleep(0.3)  # The negative entry expires sooner than a normal one
+        assert await app.lookup_invite("gone") is None
+        assert stub.requests == ["gone", "gone"]
+
+    asyncio.run(with_stub({}, test))
+
+
+def test_cached_invite_expires_after_ttl(monkeypatch):
+    monkeypatch.setattr(app, "invite_cache", app.TTLCache(maxsize=10, ttl=0.2))
+
+    async def test(stub):
+        await app.lookup_invite("abc")
+        await app.lookup_invite("abc")
+        await asyncio.sleep(0.3)
+        assert await app.lookup_invite("abc") == ("123", "Test Server")
+        assert stub.requests == ["abc", "abc"]
+
+    asyncio.run(with_stub({"abc": ("123", "Test Server")}, test))
+
+
+def test_least_recently_used_invite_is_evicted(monkeypatch):
+    monkeypatch.setattr(app, "invite_cache", app.TTLCache(maxsize=2, ttl=600))
+    guilds = {"a": ("1", "A"), "b": ("2", "B"), "c": ("3", "C")}
+
+    async def test(stub):
+        await app.lookup_invite("a")
+        await app.lookup_invite("b")
+        await app.lookup_invite("a")  # "a" is used again, so "b" is now the oldest
+        await app.lookup_invite("c")  # Cache is full, "b" goes
+        await app.lookup_invite("a")
+        await app.lookup_invite("b")
+        assert stub.requests == ["a", "b", "c", "b"]
+
+    asyncio.run(with_stub(guilds, test))
@@ -0,0 +1,47 @@
+# /leaderboard windows: this hour/today and the snapshots of the window before
+from datetime import datetime
+
+import app
+
+
+def at(monkeypatch, when):
+    class FixedDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return when
+    monkeypatch.setattr(app, "datetime", FixedDatetime)
+
+
+def new_leaderboard():
+    leaderboard = app.BumpLeaderboard()
+    leaderboard.loaded = True  # Only the windows are tested, not the all-time counts from storage
+    return leaderboard
+
+
+def test_previous_window_becomes_the_snapshot(monkeypatch):
+    leaderboard = new_leaderboard()
+    at(monkeypatch, datetime(2024, 5, 1, 10, 5))
+    leaderboard.record(1, 10)
+    leaderboard.record(1, 11)
+    leaderboard.record(2, 5)
+
+    at(monkeypatch, datetime(2024, 5, 1, 11, 5))
+    assert leaderboard.get_top("hour") == []
+    assert leaderboard.get_top("last-hour") == [(1, 2), (2, 1)]
+    assert leaderboard.get_top("day") == [(1, 2), (2, 1)]
+
+    at(monkeypatch, datetime(2024, 5, 2, 0, 5))
+    assert leaderboard.get_top("last-day") == [(1, 2), (2, 1)]
+
+
+def test_older_windows_are_not_shown_as_the_last_one(monkeypatch):
+    leaderboard = new_leaderboard()
+    at(monkeypatch, datetime(2024, 5, 1, 10, 5))
+    leaderboard.record(1, 10)
+
+    at(monkeypatch, datetime(2024, 5, 1, 14, 5))
+    assert leaderboard.get_top("last-hour") == []
+    assert leaderboard.get_top("last-day") == []
+
+    at(monkeypatch, datetime(2024, 5, 9, 10, 5))
+    assert leaderboard.get_top("last-day") == []
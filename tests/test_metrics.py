@@ -0,0 +1,23 @@
+# The log filter that drops repeated messages
+import logging
+
+import metrics
+
+
+def record(message, *args, level=logging.ERROR, name="bumpbot"):
+    return logging.LogRecord(name, level, __file__, 1, message, args, None)
+
+
+def test_repeated_messages_are_dropped_after_the_burst():
+    log_filter = metrics.RateLimitFilter(burst=2, interval=60)
+    passed = [log_filter.filter(record("❌ Failed to save %s: %s", "a.yml", "disk full")) for _ in range(4)]
+    assert passed == [True, True, False, False]
+
+
+def test_other_files_have_their_own_budget():
+    log_filter = metrics.RateLimitFilter(burst=2, interval=60)
+    for _ in range(3):
+        log_filter.filter(record("❌ Failed to save %s: %s", "a.yml", "disk full"))
+    assert log_filter.filter(record("❌ Failed to save %s: %s", "b.yml", "disk full"))
+    assert log_filter.filter(record("❌ Failed to save %s: %s", "a.yml", "disk full", name="bumpworker"))
+
@@ -0,0 +1,53 @@
+# SqliteStorage: queued writes survive a failed batch (like "database is locked")
+import sqlite3
+
+import app
+
+
+def failing_once(storage, during_failure=None):
+    """ Makes the next batch fail; `during_failure` runs while it fails (writes that come in meanwhile). """
+    write_batch = storage._write_batch
+    calls = []
+
+    def fake(batch):
+        calls.append(dict(batch))
+        if len(calls) == 1:
+            if during_failure:
+                during_failure()
+            raise sqlite3.OperationalError("database is locked")
+        write_batch(batch)
+    storage._write_batch = fake
+    return calls
+
+
+def test_failed_batch_is_written_later(tmp_path):
+    storage = app.SqliteStorage(str(tmp_path / "bot.db"))
+    calls = failing_once(storage)
+    storage.save(app.get_server_file(1, "ad"), {"message": "hello"})
+    storage.increment_bumps(1)
+    storage.flush()
+    assert len(calls) == 2
+
+    fresh = app.SqliteStorage(str(tmp_path / "bot.db"))
+    assert fresh.load(app.get_server_file(1, "ad")) == {"message": "hello"}
+    assert fresh.load(app.get_server_file(1, "total-bumps")) == {"count": 1}
+
+
+def test_newer_writes_win_and_increments_add_up(tmp_path):
+    storage = app.SqliteStorage(str(tmp_path / "bot.db"))
+
+    def newer_writes():
+        storage.save(app.get_server_file(1, "ad"), {"message": "new"})
+        storage.increment_bumps(1, 2)
+        storage.delete_guild(2)
+
+    failing_once(storage, newer_writes)
+    storage.save(app.get_server_file(1, "ad"), {"message": "old"})
+    storage.increment_bumps(1)
+    storage.save(app.get_server_file(2, "ad"), {"message": "gone"})
+    storage.flush()
+
+    fresh = app.SqliteStorage(str(tmp_path / "bot.db"))
+    assert fresh.load(app.get_server_file(1, "ad")) == {"message": "new"}
+    assert fresh.load(app.get_server_file(1, "total-bumps")) == {"count": 3}
+    assert fresh.load(app.get_server_file(2, "ad")) == {}